@@ -10,6 +10,9 @@ import { useRouter } from 'expo-router';
 interface LaneDetail {
   delay_minutes?: number | string;
   lanes_open?: number;
+  usual_delay_minutes?: number | null;
+  usual_delay_p90?: number | null;
+  percentile_rank?: number | null;
 }
 
 interface PassengerVehicleLanes {
@@ -122,11 +125,14 @@ export default function ExploreScreen() {
     return styles.text;
   };
 
-  const getDelayMessage = (delay?: number) => {
+  // Compares against the backend's hour-of-week baseline; falls back to a flat
+  // 20 minutes for lanes without enough history yet.
+  const getDelayMessage = (delay?: number, usual?: number | null) => {
     if (delay === undefined) return null;
+    const longer = typeof usual === 'number' ? delay > usual : delay > 20;
     return (
-      <Text style={[styles.badge, delay > 20 ? styles.long : styles.short]}>
-        {delay > 20 ? 'Longer than usual' : 'Shorter than usual'}
+      <Text style={[styles.badge, longer ? styles.long : styles.short]}>
+        {longer ? 'Longer than usual' : 'Shorter than usual'}
       </Text>
     );
   };
@@ -269,10 +275,15 @@ export default function ExploreScreen() {
         displayLabelKey = 'NEXUS_SENTRI_lanes';
       }
       const label = labelMap[displayLabelKey] || laneKey.replace(/_/g, ' ').replace(/\b\w/g, l => l.toUpperCase());
+      const delay = formatDelay(laneDetail?.delay_minutes);
+      const usual = laneDetail?.usual_delay_minutes;
       return (
         <Text style={styles.text} key={laneKey}>
           <Text style={{ fontWeight: 'bold' }}>{label}:</Text>
-          <Text> {formatLaneInfo(formatDelay(laneDetail?.delay_minutes), laneDetail?.lanes_open)}</Text>
+          <Text> {formatLaneInfo(delay, laneDetail?.lanes_open)}</Text>
+          {typeof delay === 'number' && !isNaN(delay) && typeof usual === 'number' && (
+            <Text> {getDelayMessage(delay, usual)}</Text>
+          )}
         </Text>
       );
     });
@@ -0,0 +1,86 @@
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+# Structured logging for the API. Records are JSON lines; handlers run on a
+# QueueListener thread, so a request thread only pays for an enqueue -- never
+# for a stdout write on a slow Render log pipe.
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# One in this many per-port debug records is kept (see sampled()).
+DEBUG_SAMPLE_EVERY = int(os.getenv("LOG_DEBUG_SAMPLE_EVERY", "100"))
+
+_handler = None
+_samplers = {}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # Starts the listener thread on the first record a process emits rather
+    # than at import: parallel_feed's forkserver preloads modules that log,
+    # and must stay single-threaded to fork cleanly. Each forked worker starts
+    # its own listener the same way.
+
+    def __init__(self, records):
+        super().__init__(records)
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    stream = logging.StreamHandler()
+                    stream.setFormatter(JsonFormatter())
+                    listener = logging.handlers.QueueListener(self.queue, stream, respect_handler_level=True)
+                    listener.start()
+                    atexit.register(listener.stop)
+                    self._pid = os.getpid()
+        super().enqueue(record)
+
+
+def setup():
+    global _handler
+    if _handler is not None:
+        return
+    _handler = _QueueHandler(queue.SimpleQueue())
+
+    root = logging.getLogger("bwt")
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_handler)
+    root.propagate = False
+
+
+def get_logger(name):
+    setup()
+    return logging.getLogger(f"bwt.{name}")
+
+
+def fields(**values):
+    # logger.info("msg", extra=fields(port_code=..., count=...))
+    return {"fields": values}
+
+
+def sampled(key, every=DEBUG_SAMPLE_EVERY):
+    # True for the 1st, (every+1)th, ... call per key. Cheap enough to guard
+    # per-port debug records without a lock.
+    counter = _samplers.get(key)
+    if counter is None:
+        counter = _samplers.setdefault(key, itertools.count())
+    return next(counter) % every == 0
@@ -0,0 +1,201 @@
+import argparse
+import gzip
+import itertools
+import json
+import os
+import sys
+import time
+
+import xmltodict
+
+import applog
+import border_app
+import history_store
+import parallel_feed
+import storage
+
+logger = applog.get_logger("backfill")
+
+# Loads archived bwt.xml snapshots into border_wait_history:
+#
+#   python backfill.py archive/2024 archive/2025/*.xml.gz
+#
+# Each file is streamed port by port (xmltodict item callbacks, so a large
+# archive is never held as one parsed tree) and turned into rows with
+# border_app.build_history_row, exactly as /record-wait-times does. Rows are
+# deduplicated on (port_code, date, time) within the run -- consecutive
+# snapshots repeat most readings -- and written BATCH_ROWS at a time to the
+# local history store and, when configured, the remote storage backend.
+#
+# Files whose rows have been written are appended to --state (path, size and
+# mtime), so an interrupted run picks up where it stopped. Re-reading a file
+# is harmless anyway: both stores skip keys they already have.
+
+BATCH_ROWS = 5000
+PROGRESS_SECONDS = 5.0
+
+
+def discover(paths):
+    # Every *.xml / *.xml.gz under the given files and directories, sorted.
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _dirs, files in os.walk(path):
+                found.extend(os.path.join(root, name) for name in files if name.endswith((".xml", ".xml.gz")))
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+def load_state(state_path):
+    done = set()
+    if state_path and os.path.exists(state_path):
+        with open(state_path) as f:
+            for line in f:
+                entry = json.loads(line)
+                done.add((entry["path"], entry["size"], entry["mtime"]))
+    return done
+
+
+def file_rows(path):
+    # (rows, stale_ports) for one archived snapshot, streamed port by port.
+    rows, stale_ports = [], []
+
+    def on_item(item_path, item):
+        if item_path[-1][0] == "port" and isinstance(item, dict):
+            rows.append(border_app.build_history_row(item, stale_ports))
+        return True
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        xmltodict.parse(f, item_depth=2, item_callback=on_item)
+    return rows, stale_ports
+
+
+def _safe_file_rows(path):
+    try:
+        return file_rows(path), None
+    except Exception as e:
+        return ([], []), repr(e)
+
+
+def _results(paths, workers):
+    # (path, (rows, stale_ports), error) in input order. With more than one
+    # worker, files are parsed in the parallel_feed pool a window at a time
+    # so finished results never pile up far ahead of the writer.
+    if workers <= 1:
+        for path in paths:
+            yield (path, *_safe_file_rows(path))
+        return
+    pool = parallel_feed.executor(workers)
+    paths = iter(paths)
+    while window := list(itertools.islice(paths, workers * parallel_feed.CHUNKS_PER_WORKER)):
+        for path, (result, error) in zip(window, pool.map(_safe_file_rows, window)):
+            yield path, result, error
+
+
+class Backfill:
+    def __init__(self, remote=None, local=True, state_path=None, batch_rows=BATCH_ROWS):
+        self.remote = remote
+        self.local = local
+        self.state_path = state_path
+        self.batch_rows = batch_rows
+        self.seen = set()
+        self.batch = []
+        self.pending = []
+        self.stats = {
+            "files": 0, "failed": 0, "rows": 0, "duplicates": 0, "stale": 0,
+            "local_inserted": 0, "inserted": 0, "skipped": 0,
+        }
+
+    def add(self, path, rows, stale_ports):
+        self.stats["files"] += 1
+        self.stats["stale"] += len(stale_ports)
+        for row in rows:
+            key = storage.row_key(row)
+            if key in self.seen:
+                self.stats["duplicates"] += 1
+                continue
+            self.seen.add(key)
+            self.batch.append(row)
+        self.stats["rows"] += len(rows)
+        self.pending.append(path)
+        if len(self.batch) >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            if self.local:
+                self.stats["local_inserted"] += history_store.insert_rows(self.batch)
+            if self.remote is not None:
+                inserted, skipped = self.remote.insert_new(self.batch)
+                self.stats["inserted"] += inserted
+                self.stats["skipped"] += skipped
+            self.batch = []
+        # Only now are these files fully written.
+        if self.state_path and self.pending:
+            with open(self.state_path, "a") as f:
+                for path in self.pending:
+                    f.write(json.dumps(_fingerprint(path)) + "\n")
+        self.pending = []
+
+
+def _progress(done, total, stats, started):
+    elapsed = time.monotonic() - started
+    rate = done / elapsed if elapsed else 0.0
+    eta = (total - done) / rate if rate else 0.0
+    print(
+        f"files {done}/{total}  rows {stats['rows']}  new local {stats['local_inserted']}  "
+        f"remote {stats['inserted']}/{stats['skipped']} skipped  duplicates {stats['duplicates']}  "
+        f"failed {stats['failed']}  {rate:.1f} files/s  eta {eta:.0f}s",
+        file=sys.stderr,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill border_wait_history from archived bwt.xml files.")
+    parser.add_argument("paths", nargs="+", help="files or directories of *.xml / *.xml.gz")
+    parser.add_argument("--state", default="backfill_state.jsonl", help="completed-file log, for resuming")
+    parser.add_argument("--restart", action="store_true", help="ignore --state and re-read every file")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    parser.add_argument("--workers", type=int, default=parallel_feed.PARSE_WORKERS,
+                        help="processes parsing files in parallel")
+    parser.add_argument("--no-local", action="store_true", help="skip the local history store")
+    parser.add_argument("--no-remote", action="store_true", help="skip the configured remote storage")
+    args = parser.parse_args()
+
+    files = discover(args.paths)
+    done = set() if args.restart else load_state(args.state)
+    todo = [path for path in files if tuple(_fingerprint(path).values()) not in done]
+    remote = None if args.no_remote else storage.from_env()
+    print(f"{len(files)} files, {len(files) - len(todo)} already done, {len(todo)} to load; "
+          f"local={'no' if args.no_local else history_store.HISTORY_DB_PATH} "
+          f"remote={type(remote).__name__ if remote else 'no'}", file=sys.stderr)
+
+    backfill = Backfill(remote, not args.no_local, args.state, args.batch_rows)
+    started = last_report = time.monotonic()
+    try:
+        for count, (path, (rows, stale_ports), error) in enumerate(_results(todo, args.workers), 1):
+            if error is not None:
+                backfill.stats["failed"] += 1
+                logger.warning("could not read archive", extra=applog.fields(path=path, error=error))
+            else:
+                backfill.add(path, rows, stale_ports)
+            if time.monotonic() - last_report >= PROGRESS_SECONDS:
+                _progress(count, len(todo), backfill.stats, started)
+                last_report = time.monotonic()
+        backfill.flush()
+    finally:
+        parallel_feed.shutdown()
+    _progress(len(todo), len(todo), backfill.stats, started)
+    print(json.dumps(backfill.stats))
+    sys.exit(1 if backfill.stats["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
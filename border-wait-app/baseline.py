@@ -0,0 +1,68 @@
+import numpy as np
+
+import history_store
+import history_matrix
+
+# Where each history lane lives in the nested /wait-times item.
+OUTPUT_LANE_PATHS = {
+    "passenger_standard": ("passenger_vehicle_lanes", "standard_lanes"),
+    "passenger_ready": ("passenger_vehicle_lanes", "ready_lanes"),
+    "passenger_sentri": ("passenger_vehicle_lanes", "sentri_lanes"),
+    "commercial_standard": ("commercial_vehicle_lanes", "standard_lanes"),
+    "commercial_fast": ("commercial_vehicle_lanes", "FAST_lanes"),
+    "pedestrian_standard": ("pedestrian_lanes", "standard_lanes"),
+    "pedestrian_ready": ("pedestrian_lanes", "ready_lanes"),
+    "pedestrian_sentri": ("pedestrian_lanes", "sentri_lanes"),
+    "pedestrian_ready_sentri": ("pedestrian_lanes", "ready_sentri_lanes"),
+}
+
+def lane_delay(item, lane):
+    # Current delay in minutes for a history lane name, or None.
+    group, key = OUTPUT_LANE_PATHS[lane]
+    return history_store.as_minutes(((item.get(group) or {}).get(key) or {}).get("delay_minutes"))
+
+
+# Fewer samples than this in an hour-of-week bucket and we don't claim a "usual".
+MIN_SAMPLES = 4
+
+
+def annotate(summary):
+    # Adds usual_delay_minutes / usual_delay_p90 / percentile_rank to every lane
+    # of every item. Runs once per snapshot: one sketch query per distinct
+    # hour-of-week present in the feed (normally one per time zone).
+    by_how = {}
+    for item in summary:
+        ts = history_store.parse_ts(item.get("date"), item.get("time"))
+        if ts is not None:
+            by_how.setdefault(history_store.hour_of_week(ts), []).append(item)
+
+    for how, items in by_how.items():
+        sketches = history_store.load_sketches("how", how)
+        for item in items:
+            for lane, (group, key) in OUTPUT_LANE_PATHS.items():
+                detail = (item.get(group) or {}).get(key)
+                if detail is None:
+                    continue
+                sketch = sketches.get((item.get("port_code"), lane))
+                if sketch is None or sketch.n < MIN_SAMPLES:
+                    detail["usual_delay_minutes"] = None
+                    detail["usual_delay_p90"] = None
+                    detail["percentile_rank"] = None
+                    continue
+                detail["usual_delay_minutes"] = sketch.quantile(0.5)
+                detail["usual_delay_p90"] = sketch.quantile(0.9)
+                delay = history_store.as_minutes(detail.get("delay_minutes"))
+                detail["percentile_rank"] = None if delay is None else sketch.rank(delay)
+    return summary
+
+
+def fit_batch(cube):
+    # Hour-of-week p50/p90 for every port and lane of a history cube at once,
+    # each shaped (ports, lanes, 168). Hours never observed fall back to the
+    # lane's quantiles over the whole window.
+    weekly = history_matrix.by_hour_of_week(cube)
+    p50, p90 = history_matrix.nan_quantiles(weekly, (0.5, 0.9), axis=2)
+    overall = history_matrix.nan_quantiles(cube, (0.5, 0.9), axis=2)
+    p50 = np.where(np.isnan(p50), overall[0][..., None], p50)
+    p90 = np.where(np.isnan(p90), overall[1][..., None], p90)
+    return p50, p90
@@ -0,0 +1,96 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import forecast
+import history_matrix
+import history_store
+
+# Load and fit time for the vectorized baseline + forecast model on synthetic
+# hourly history: a daily rush-hour shape per port and lane, noise, and a
+# share of missing readings (NaN, as clean_value() would have produced None).
+# The load step is history_matrix.load_cube reading that history back from
+# 1h rollups in a scratch store, as forecast.refresh does.
+
+
+def synthetic_cube(ports, weeks, missing, seed=0):
+    rng = np.random.default_rng(seed)
+    hours = weeks * history_matrix.HOURS_PER_WEEK
+    lanes = len(history_store.LANES)
+    hour_of_day = np.arange(hours) % 24
+    shape = 20 + 25 * np.exp(-((hour_of_day - 8) ** 2) / 8) + 30 * np.exp(-((hour_of_day - 17) ** 2) / 8)
+    scale = rng.uniform(0.3, 2.0, size=(ports, lanes, 1))
+    cube = shape[None, None, :] * scale + rng.normal(0, 6, size=(ports, lanes, hours))
+    cube = np.clip(np.round(cube), 0, None)
+    cube[rng.random(cube.shape) < missing] = np.nan
+    return cube
+
+
+def fill_rollups(cube, start_ts, path):
+    # Writes the cube as the 1h wait_rollups the recorder would have built,
+    # one reading per bucket, into a fresh history store at path.
+    conn = history_store.connect(path)
+    p, l, t = np.nonzero(~np.isnan(cube))
+    values = cube[p, l, t].astype(int).tolist()
+    with conn:
+        conn.executemany(
+            "INSERT INTO wait_rollups (port_code, lane, resolution, bucket_ts, count, sum, min, max, sum_sq) "
+            "VALUES (?, ?, '1h', ?, 1, ?, ?, ?, ?)",
+            (
+                (f"{port:06d}", history_store.LANES[lane], start_ts + hour * 3600, v, v, v, v * v)
+                for port, lane, hour, v in zip(p.tolist(), l.tolist(), t.tolist(), values)
+            ),
+        )
+    return len(values)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time baseline/forecast fitting over synthetic hourly history.")
+    parser.add_argument("--ports", type=int, default=160)
+    parser.add_argument("--weeks", type=int, default=52)
+    parser.add_argument("--missing", type=float, default=0.3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--load-ports", type=int, default=40,
+                        help="ports of hourly rollups to store and read back with load_cube (0: skip)")
+    args = parser.parse_args()
+
+    cube = synthetic_cube(args.ports, args.weeks, args.missing)
+    print(f"cube: {cube.shape[0]} ports x {cube.shape[1]} lanes x {cube.shape[2]} hours "
+          f"({cube.nbytes / 1e6:.0f} MB, {np.isnan(cube).mean():.0%} missing)")
+
+    if args.load_ports:
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "history.db")
+            start_ts = history_matrix.week_floor(1748869800) - (args.weeks - 1) * history_matrix.WEEK
+            stored = fill_rollups(cube[:args.load_ports], start_ts, path)
+            load_s, (ports, _start, loaded) = timed(lambda: history_matrix.load_cube(args.weeks, path), args.repeat)
+            history_store.connect(path).close()
+        print(f"load_cube ({len(ports)} ports, {stored} hourly rollups -> {loaded.shape}): {load_s * 1000:.0f} ms")
+
+    fit_s, (profile, upper, phi) = timed(lambda: forecast.fit(cube), args.repeat)
+    print(f"fit (p50/p90 baseline + AR(1) decay): {fit_s * 1000:.0f} ms")
+
+    port_rows = np.arange(args.ports)
+    now_ts = np.full(args.ports, 1748869800, dtype=np.int64)
+    current = cube[:, :, -1]
+    predict_s, _ = timed(lambda: forecast.predict(profile, phi, port_rows, now_ts, current), args.repeat)
+    print(f"predict ({len(forecast.HORIZON_MINUTES)} horizons, all ports): {predict_s * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
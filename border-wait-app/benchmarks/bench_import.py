@@ -0,0 +1,91 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold-start budget for `import border_app`: each run is a fresh interpreter,
+# as on a Render cold start. Fails when the median import time is over
+# --budget-ms, or when a module that should only load on first use (the
+# Supabase client, the uvicorn runner) was imported anyway. Supabase
+# credentials are set to dummies so the lazy path is the one measured.
+
+DEFERRED = ("supabase", "uvicorn")
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import border_app
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(",".join(name for name in sys.argv[1:] if name in sys.modules))
+"""
+
+
+def measure(deferred):
+    env = {**os.environ, "SUPABASE_URL": "http://127.0.0.1:9", "SUPABASE_KEY": "import-budget"}
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE, *deferred], cwd=APP_DIR, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout.splitlines()
+    loaded = [name for name in out[1].split(",") if name] if len(out) > 1 else []
+    return float(out[0]), loaded
+
+
+def slowest_imports(limit):
+    # border_app's direct imports by cumulative time, from -X importtime.
+    # Children are listed before their parent, one extra indent per level.
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import border_app"], cwd=APP_DIR,
+        capture_output=True, text=True, check=True,
+    ).stderr
+    lines = []
+    for line in err.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            name = parts[2]
+            lines.append((len(name) - len(name.lstrip()), int(parts[1]), name.strip()))
+    end = next(i for i, (_, _, name) in enumerate(lines) if name == "border_app")
+    depth = lines[end][0]
+    entries = []
+    for level, cumulative, name in reversed(lines[:end]):
+        if level <= depth:
+            break
+        if level == depth + 2:
+            entries.append((cumulative, name))
+    return sorted(entries, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure `import border_app` time against a budget.")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=600.0)
+    parser.add_argument("--top", type=int, default=10, help="show the slowest direct imports")
+    args = parser.parse_args()
+
+    times, loaded = [], set()
+    for _ in range(args.runs):
+        elapsed, modules = measure(DEFERRED)
+        times.append(elapsed * 1000)
+        loaded.update(modules)
+    median = statistics.median(times)
+    print(f"import border_app: median {median:.0f} ms, min {min(times):.0f} ms, "
+          f"max {max(times):.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    if args.top:
+        for cumulative, name in slowest_imports(args.top):
+            print(f"  {name:<24}{cumulative / 1000:>8.1f} ms")
+
+    failed = False
+    if median > args.budget_ms:
+        print(f"OVER BUDGET by {median - args.budget_ms:.0f} ms")
+        failed = True
+    if loaded:
+        print(f"DEFERRED MODULES IMPORTED: {', '.join(sorted(loaded))}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
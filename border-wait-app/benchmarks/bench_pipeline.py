@@ -0,0 +1,207 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xmltodict
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import border_app
+import make_fixtures
+import parallel_feed
+
+# Throughput and peak memory of the feed pipeline in border_app, per fixture:
+# parse (xmltodict), normalize (normalize_port, the /wait-times items),
+# serialize (the JSON body FastAPI sends for /wait-times) and record_rows
+# (build_history_row, the /record-wait-times rows). Baseline lookups and
+# storage are left out so the numbers don't depend on a local database.
+#
+#   python benchmarks/bench_pipeline.py --save before.json
+#   ...change things...
+#   python benchmarks/bench_pipeline.py --compare before.json
+#
+# --compare exits non-zero when a stage got slower than --threshold.
+#
+# --workers 1,2,4 adds a scaling table: parse plus normalize through the
+# parallel_feed process pool at each worker count, against the same work in
+# one process. Scaling depends on the cores available, so it is reported but
+# never counted as a regression.
+
+FIXTURES = [make_fixtures.SMALL, make_fixtures.TYPICAL, make_fixtures.INFLATED]
+
+
+def _ports(data):
+    ports = data.get("border_wait_time", {}).get("port", [])
+    return [ports] if isinstance(ports, dict) else ports
+
+
+def stages(content, parsed):
+    # (name, fn) pairs; each fn takes the previous stage's output.
+    return [
+        ("parse", lambda _: xmltodict.parse(content)),
+        ("normalize", lambda data: [border_app.normalize_port(port) for port in _ports(data)]),
+        ("serialize", lambda summary: JSONResponse(
+            jsonable_encoder({"ports_found": len(summary), "all_ports_summary": summary})
+        ).body),
+        ("record_rows", lambda _: [border_app.build_history_row(port) for port in _ports(parsed)]),
+    ]
+
+
+def run_fixture(name, min_time, repeat):
+    content = make_fixtures.load(name)
+    parsed = xmltodict.parse(content)
+    n_ports = len(_ports(parsed))
+    results = {"bytes": len(content), "ports": n_ports, "stages": {}}
+
+    value = None
+    for stage, fn in stages(content, parsed):
+        stage_input = value
+        # Best-of-`repeat` batches, each batch long enough to time reliably.
+        best = float("inf")
+        for _ in range(repeat):
+            gc.collect()
+            loops, start = 0, time.perf_counter()
+            while True:
+                value = fn(stage_input)
+                loops += 1
+                elapsed = time.perf_counter() - start
+                if elapsed >= min_time:
+                    break
+            best = min(best, elapsed / loops)
+
+        tracemalloc.start()
+        fn(stage_input)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results["stages"][stage] = {
+            "seconds": best,
+            "ops_per_sec": 1.0 / best,
+            "ports_per_sec": n_ports / best,
+            "peak_mb": peak / 1e6,
+        }
+    return results
+
+
+def run_scaling(name, worker_counts, repeat):
+    content = make_fixtures.load(name)
+    n_ports = len(_ports(xmltodict.parse(content)))
+
+    def serial():
+        [border_app.normalize_port(port) for port in _ports(xmltodict.parse(content))]
+
+    def best_of(fn):
+        best = float("inf")
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    baseline = best_of(serial)
+    results = {"ports": n_ports, "cpus": os.cpu_count(), "serial_seconds": baseline, "workers": {}}
+    for workers in worker_counts:
+        # The first call starts the pool; keep that out of the timing.
+        parallel_feed.normalize(content, workers)
+        seconds = best_of(lambda: parallel_feed.normalize(content, workers))
+        results["workers"][str(workers)] = {
+            "seconds": seconds, "ports_per_sec": n_ports / seconds, "speedup": baseline / seconds,
+        }
+    parallel_feed.shutdown()
+    return results
+
+
+def _name_width(names):
+    # Fixture column wide enough for the longest file name, plus a gap.
+    return max(len("fixture"), *map(len, names)) + 2
+
+
+def report_scaling(scaling):
+    width = _name_width(scaling)
+    print(f"\n{'fixture':<{width}}{'workers':>8}{'ports/s':>12}{'speedup':>9}")
+    for name, r in scaling.items():
+        print(f"{name:<{width}}{'serial':>8}{r['ports'] / r['serial_seconds']:>12.0f}{1.0:>9.2f}")
+        for workers, w in r["workers"].items():
+            print(f"{name:<{width}}{workers:>8}{w['ports_per_sec']:>12.0f}{w['speedup']:>9.2f}")
+        print(f"({r['cpus']} CPUs)")
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, previous=None, threshold=0.1):
+    regressions = []
+    width = _name_width(results["fixtures"])
+    print(f"{'fixture':<{width}}{'stage':<13}{'ops/s':>10}{'ports/s':>12}{'peak MB':>10}{'vs prev':>10}")
+    for name, fixture in results["fixtures"].items():
+        for stage, r in fixture["stages"].items():
+            change = ""
+            before = ((previous or {}).get("fixtures", {}).get(name, {}).get("stages", {}).get(stage))
+            if before:
+                ratio = r["seconds"] / before["seconds"] - 1
+                change = f"{ratio:+.1%}"
+                if ratio > threshold:
+                    regressions.append((name, stage, ratio))
+            print(f"{name:<{width}}{stage:<13}{r['ops_per_sec']:>10.1f}{r['ports_per_sec']:>12.0f}"
+                  f"{r['peak_mb']:>10.1f}{change:>10}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parse/normalize/serialize/record-row throughput.")
+    parser.add_argument("--fixture", action="append", choices=FIXTURES, help="default: all fixtures")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timed batch")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON from an earlier --save to diff against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown ratio counted as a regression")
+    parser.add_argument("--workers", help="comma-separated pool sizes for the parallel_feed scaling table")
+    parser.add_argument("--scaling-fixture", default=make_fixtures.INFLATED, choices=FIXTURES)
+    args = parser.parse_args()
+
+    results = {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "fixtures": {name: run_fixture(name, args.min_time, args.repeat) for name in args.fixture or FIXTURES},
+    }
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"comparing {results['revision']} against {previous.get('revision')}")
+    regressions = report(results, previous, args.threshold)
+    if args.workers:
+        worker_counts = [int(n) for n in args.workers.split(",")]
+        results["scaling"] = {
+            args.scaling_fixture: run_scaling(args.scaling_fixture, worker_counts, args.repeat),
+        }
+        report_scaling(results["scaling"])
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        for name, stage, ratio in regressions:
+            print(f"REGRESSION {name} {stage}: {ratio:+.1%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
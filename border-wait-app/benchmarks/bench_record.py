@@ -0,0 +1,125 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xmltodict
+
+import border_app
+import make_fixtures
+import storage
+
+# Recording throughput against the local stand-ins for border_wait_history:
+# the old per-row pattern (select by key, then insert) versus the batched
+# insert_new() that /record-wait-times uses, for a first pass (all rows new)
+# and a repeat pass (all rows duplicates, the common case between CBP updates).
+# --latency-ms adds a simulated round trip per storage call, which is where
+# batching pays off against Supabase. Each case runs on an empty store and on
+# one prefilled with --prefill rows of older readings for the same ports, so
+# key lookups that grow with the table show up.
+
+
+class RoundTrips(storage.HistoryStorage):
+    def __init__(self, inner, latency):
+        self.inner = inner
+        self.latency = latency
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def exists(self, port_code, date, time):
+        self._call()
+        return self.inner.exists(port_code, date, time)
+
+    def existing_keys(self, keys):
+        self._call()
+        return self.inner.existing_keys(keys)
+
+    def insert_many(self, rows):
+        self._call()
+        self.inner.insert_many(rows)
+
+    def upsert(self, rows):
+        self._call()
+        self.inner.upsert(rows)
+
+
+def per_row(backend, rows):
+    inserted = skipped = 0
+    for row in rows:
+        if backend.exists(*storage.row_key(row)):
+            skipped += 1
+            continue
+        backend.insert(row)
+        inserted += 1
+    return inserted, skipped
+
+
+def batched(backend, rows):
+    return backend.insert_new(rows)
+
+
+def upsert(backend, rows):
+    backend.upsert(rows)
+    return len(rows), 0
+
+
+def make_backend(kind, workdir, run):
+    if kind == "memory":
+        return storage.MemoryStorage()
+    return storage.SQLiteStorage(os.path.join(workdir, f"{run}.db"))
+
+
+def older_rows(rows, count):
+    # count rows for the fixture's ports at 5-minute readings before 2025,
+    # so none collides with a fixture key.
+    older, slot = [], 0
+    while len(older) < count:
+        day = date(2024, 12, 31) - timedelta(days=slot // 288)
+        reading = {"date": day.strftime("%m/%d/%Y"), "time": f"{slot % 288 // 12:02d}:{slot % 12 * 5:02d}:00"}
+        older.extend({**row, **reading} for row in rows[:count - len(older)])
+        slot += 1
+    return older
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recording rows into the history storage stand-ins.")
+    parser.add_argument("--fixture", default=make_fixtures.TYPICAL,
+                        choices=[make_fixtures.SMALL, make_fixtures.TYPICAL, make_fixtures.INFLATED])
+    parser.add_argument("--backend", action="append", choices=["memory", "sqlite"], help="default: both")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated round trip per storage call")
+    parser.add_argument("--prefill", type=int, default=50000, help="older rows already stored (0: empty only)")
+    args = parser.parse_args()
+
+    data = xmltodict.parse(make_fixtures.load(args.fixture))
+    rows = [border_app.build_history_row(port) for port in data["border_wait_time"]["port"]]
+    print(f"{args.fixture}: {len(rows)} rows, {args.latency_ms:g} ms per storage call")
+    print(f"{'backend':<8}{'store':<10}{'strategy':<10}{'pass':<8}{'rows/s':>12}{'calls':>8}"
+          f"{'inserted':>10}{'skipped':>9}")
+
+    stores = [("empty", [])] + ([(f"{args.prefill}", older_rows(rows, args.prefill))] if args.prefill else [])
+    with tempfile.TemporaryDirectory() as workdir:
+        for kind in args.backend or ["memory", "sqlite"]:
+            for store, prefill in stores:
+                for name, strategy in (("per_row", per_row), ("batched", batched), ("upsert", upsert)):
+                    inner = make_backend(kind, workdir, f"{kind}-{store}-{name}")
+                    inner.insert_many(prefill)
+                    backend = RoundTrips(inner, args.latency_ms / 1000.0)
+                    for label in ("first", "repeat"):
+                        backend.calls = 0
+                        start = time.perf_counter()
+                        inserted, skipped = strategy(backend, rows)
+                        elapsed = time.perf_counter() - start
+                        print(f"{kind:<8}{store:<10}{name:<10}{label:<8}{len(rows) / elapsed:>12.0f}"
+                              f"{backend.calls:>8}{inserted:>10}{skipped:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import argparse
+import glob
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import make_fixtures
+
+# Local stand-in for https://bwt.cbp.gov/xml/bwt.xml. Replays recorded
+# snapshots on a timeline and injects the upstream failures we see in
+# production -- slow responses, 304s, truncated XML, 5xx -- from a seeded RNG,
+# so fetch/cache/record behaviour can be load-tested offline and repeatably:
+#
+#   python benchmarks/fake_cbp.py --port 8081 --interval 30 --error-rate 0.05
+#   CBP_URL=http://127.0.0.1:8081/xml/bwt.xml uvicorn border_app:app
+#
+# GET /stats returns request and fault counters as plain text.
+
+
+class Feed:
+    def __init__(self, snapshots, interval, latency_ms=0.0, jitter_ms=0.0, not_modified_rate=0.0,
+                 truncate_rate=0.0, error_rate=0.0, seed=0):
+        self.snapshots = []
+        for content in snapshots:
+            etag = '"' + hashlib.sha1(content).hexdigest()[:16] + '"'
+            self.snapshots.append((content, etag))
+        self.interval = interval
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.not_modified_rate = not_modified_rate
+        self.truncate_rate = truncate_rate
+        self.error_rate = error_rate
+        self.started = time.monotonic()
+        self.started_wall = time.time()
+        self.stats = {"requests": 0, "ok": 0, "not_modified": 0, "truncated": 0, "errors": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def current(self):
+        # Snapshot i is served from started + i * interval, looping at the end.
+        step = int((time.monotonic() - self.started) // self.interval) if self.interval > 0 else 0
+        content, etag = self.snapshots[step % len(self.snapshots)]
+        last_modified = formatdate(self.started_wall + step * self.interval, usegmt=True)
+        return content, etag, last_modified
+
+    def plan(self):
+        # Draws are serialized so a given seed yields the same fault sequence
+        # in request-arrival order.
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            roll = self._rng.random()
+            status = self._rng.choice([500, 502, 503])
+        if roll < self.error_rate:
+            return delay, "error", status
+        roll -= self.error_rate
+        if roll < self.not_modified_rate:
+            return delay, "not_modified", 304
+        roll -= self.not_modified_rate
+        if roll < self.truncate_rate:
+            return delay, "truncated", 200
+        return delay, "ok", 200
+
+    def count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+
+def make_handler(feed):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body=b"", headers=()):
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body and self.command != "HEAD":
+                self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                body = "".join(f"{name} {value}\n" for name, value in feed.stats.items()).encode()
+                return self._send(200, body, [("Content-Type", "text/plain")])
+
+            delay, outcome, status = feed.plan()
+            if delay:
+                time.sleep(delay)
+            content, etag, last_modified = feed.current()
+            validators = [("ETag", etag), ("Last-Modified", last_modified)]
+            if outcome == "error":
+                feed.count("errors")
+                return self._send(status, b"upstream error",
+                                  [("Content-Type", "text/plain")])
+            # Like CBP, only conditional requests get a 304.
+            conditional = self.headers.get("If-None-Match") or self.headers.get("If-Modified-Since")
+            if (outcome == "not_modified" and conditional) or self.headers.get("If-None-Match") == etag:
+                feed.count("not_modified")
+                return self._send(304, headers=validators)
+            if outcome == "truncated":
+                feed.count("truncated")
+                content = content[: len(content) // 2]
+            else:
+                feed.count("ok")
+            self._send(200, content, [("Content-Type", "text/xml"), *validators])
+
+        do_HEAD = do_GET
+
+    return Handler
+
+
+def load_snapshots(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.xml"))))
+        else:
+            files.append(path)
+    if not files:
+        sys.exit("no snapshot files found")
+    snapshots = []
+    for path in files:
+        with open(path, "rb") as f:
+            snapshots.append(f.read())
+    return files, snapshots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded bwt.xml snapshots with injected faults.")
+    parser.add_argument("snapshots", nargs="*", help="XML files or directories of them, replayed in order "
+                        "(default: the small and 120-port benchmark fixtures)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--interval", type=float, default=60.0, help="seconds each snapshot is served")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--not-modified-rate", type=float, default=0.0, help="share of conditional requests answered 304")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="share of responses cut mid-document")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 500/502/503 responses")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    files, snapshots = load_snapshots(
+        args.snapshots or [make_fixtures.path(make_fixtures.SMALL), make_fixtures.path(make_fixtures.TYPICAL)]
+    )
+    feed = Feed(snapshots, args.interval, args.latency_ms, args.jitter_ms, args.not_modified_rate,
+                args.truncate_rate, args.error_rate, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(feed))
+    server.daemon_threads = True
+    print(f"serving {len(files)} snapshot(s) every {args.interval:g}s on http://{args.host}:{args.port}/xml/bwt.xml")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
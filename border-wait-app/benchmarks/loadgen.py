@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Closed-loop load generator for the API: --concurrency workers each issue the
+# next request as soon as the previous one returns, picking endpoints by the
+# weights in --mix. Reports per-endpoint and overall throughput, error counts
+# and p50/p95/p99 latency. With --spawn it starts fake_cbp.py and a uvicorn
+# worker pointed at it, so runs are offline and repeatable:
+#
+#   python benchmarks/loadgen.py --spawn --concurrency 32 --duration 30
+#   python benchmarks/loadgen.py --base-url https://staging.example --mix /wait-times=1
+
+DEFAULT_MIX = "/=1,/wait-times=16,/ports=2,/record-wait-times=1"
+POST_PATHS = {"/record-wait-times"}
+
+
+def parse_mix(value):
+    mix = []
+    for part in value.split(","):
+        path, _, weight = part.strip().partition("=")
+        mix.append((path, float(weight or 1)))
+    return mix
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def worker(client, mix, deadline, samples, rng):
+    paths = [path for path, _ in mix]
+    weights = [weight for _, weight in mix]
+    while time.monotonic() < deadline:
+        path = rng.choices(paths, weights)[0]
+        start = time.perf_counter()
+        try:
+            if path in POST_PATHS:
+                response = await client.post(path)
+            else:
+                response = await client.get(path)
+            # Handlers report failures as {"error": ...} with a 200.
+            ok = response.status_code < 400 and not response.content.startswith(b'{"error"')
+        except httpx.HTTPError:
+            ok = False
+        samples.append((path, time.perf_counter() - start, ok))
+
+
+async def run(base_url, mix, concurrency, duration, warmup, seed):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        if warmup:
+            await asyncio.gather(*(
+                worker(client, mix, time.monotonic() + warmup, [], random.Random(seed - i - 1))
+                for i in range(concurrency)
+            ))
+        samples = []
+        started = time.monotonic()
+        await asyncio.gather(*(
+            worker(client, mix, started + duration, samples, random.Random(seed + i))
+            for i in range(concurrency)
+        ))
+        return samples, time.monotonic() - started
+
+
+def summarize(samples, elapsed):
+    groups = {}
+    for path, latency, ok in samples:
+        groups.setdefault(path, []).append((latency, ok))
+    groups["all"] = [(latency, ok) for _, latency, ok in samples]
+    results = {}
+    for path, entries in groups.items():
+        ordered = sorted(latency for latency, _ in entries)
+        results[path] = {
+            "requests": len(entries),
+            "errors": sum(1 for _, ok in entries if not ok),
+            "rps": len(entries) / elapsed,
+            "p50_ms": percentile(ordered, 0.50) * 1000 if ordered else None,
+            "p95_ms": percentile(ordered, 0.95) * 1000 if ordered else None,
+            "p99_ms": percentile(ordered, 0.99) * 1000 if ordered else None,
+        }
+    return results
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def spawn(args):
+    # fake_cbp.py plus one uvicorn worker reading from it. Returns (base_url, processes).
+    feed_port, app_port = _free_port(), _free_port()
+    feed_args = [sys.executable, os.path.join(BENCH_DIR, "fake_cbp.py"), "--port", str(feed_port),
+                 "--interval", str(args.feed_interval), "--latency-ms", str(args.feed_latency_ms)]
+    feed = subprocess.Popen(feed_args, stdout=subprocess.DEVNULL)
+    env = {
+        **os.environ,
+        "CBP_URL": f"http://127.0.0.1:{feed_port}/xml/bwt.xml",
+        # Every file the app writes stays in the workdir: a snapshot cache left
+        # in the app directory would be served, fake feed and all, by the next
+        # normal start.
+        "HISTORY_DB_PATH": os.path.join(args.workdir, "loadgen_history.db"),
+        "SNAPSHOT_CACHE_PATH": os.path.join(args.workdir, "loadgen_snapshot.bin"),
+        "EXPORT_DIR": os.path.join(args.workdir, "loadgen_exports"),
+        "LOG_LEVEL": "ERROR",
+    }
+    env.pop("SUPABASE_URL", None)
+    env.pop("SUPABASE_KEY", None)
+    env.pop("HISTORY_STORAGE", None)
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "border_app:app", "--host", "127.0.0.1", "--port", str(app_port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=APP_DIR, env=env,
+    )
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        _wait_for(f"http://127.0.0.1:{feed_port}/stats")
+        _wait_for(base_url + "/")
+    except Exception:
+        for process in (app, feed):
+            process.terminate()
+        raise
+    return base_url, [app, feed]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API and report throughput and latency percentiles.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:10000")
+    parser.add_argument("--spawn", action="store_true", help="start fake_cbp.py and the app locally")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds first")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="path=weight pairs, comma separated")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--feed-interval", type=float, default=60.0, help="with --spawn: seconds per snapshot")
+    parser.add_argument("--feed-latency-ms", type=float, default=150.0, help="with --spawn: upstream latency")
+    parser.add_argument("--workdir", default=os.getcwd(), help="with --spawn: where the history DB, snapshot cache and exports go")
+    parser.add_argument("--save", help="write results as JSON")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    processes = []
+    base_url = args.base_url
+    if args.spawn:
+        base_url, processes = spawn(args)
+    try:
+        samples, elapsed = asyncio.run(
+            run(base_url, mix, args.concurrency, args.duration, args.warmup, args.seed)
+        )
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    results = summarize(samples, elapsed)
+    print(f"{base_url}  concurrency={args.concurrency}  {elapsed:.1f}s")
+    print(f"{'path':<22}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for path, r in results.items():
+        latencies = "".join(
+            f"{r[key]:>9.1f}" if r[key] is not None else f"{'-':>9}" for key in ("p50_ms", "p95_ms", "p99_ms")
+        )
+        print(f"{path:<22}{r['requests']:>9}{r['errors']:>8}{r['rps']:>9.1f}{latencies}")
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"base_url": base_url, "concurrency": args.concurrency, "mix": args.mix,
+                       "elapsed": elapsed, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import argparse
+import os
+import random
+import sys
+
+import xmltodict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SMALL = "bwt_small.xml"
+TYPICAL = "bwt_synthetic_120.xml"
+RECORDED = "bwt_recorded.xml"
+INFLATED = "bwt_10k.xml"
+INFLATED_PORTS = 10_000
+
+# bwt.xml fixtures for the benchmarks. bwt_small.xml and bwt_synthetic_120.xml
+# are checked in and both synthetic: the same element layout and value mix as
+# the live CBP feed ("N/A", "Lanes Closed", empty update times, ports without
+# <time>), the latter at the feed's usual ~120 ports. `--record` also saves a
+# capture of CBP_URL as bwt_recorded.xml, which is not checked in. The
+# 10k-port file is inflated from bwt_synthetic_120.xml on demand (it is
+# ~20 MB), deterministically, so numbers stay comparable across commits.
+
+CROSSINGS = [
+    ("250401", "San Ysidro", "San Ysidro", "California"), ("250407", "San Ysidro", "PedWest", "California"),
+    ("250601", "Otay Mesa", "Passenger", "California"), ("250602", "Otay Mesa", "Commercial", "California"),
+    ("250501", "Tecate", "Tecate", "California"), ("250301", "Calexico", "East", "California"),
+    ("250302", "Calexico", "West", "California"), ("250201", "Andrade", "Andrade", "California"),
+    ("260801", "San Luis", "San Luis I", "Arizona"), ("260802", "San Luis", "San Luis II", "Arizona"),
+    ("260201", "Lukeville", "Lukeville", "Arizona"), ("260401", "Nogales", "Deconcini", "Arizona"),
+    ("260402", "Nogales", "Mariposa", "Arizona"), ("260403", "Nogales", "Morley Gate", "Arizona"),
+    ("260301", "Naco", "Naco", "Arizona"), ("260101", "Douglas", "Raul Hector Castro", "Arizona"),
+    ("240601", "Columbus", "Columbus", "New Mexico"), ("240801", "Santa Teresa", "Santa Teresa", "New Mexico"),
+    ("240201", "El Paso", "Bridge of the Americas", "Texas"), ("240202", "El Paso", "Paso Del Norte", "Texas"),
+    ("240203", "El Paso", "Stanton DCL", "Texas"), ("240204", "El Paso", "Ysleta", "Texas"),
+    ("240221", "El Paso", "Tornillo", "Texas"), ("240301", "Presidio", "Presidio", "Texas"),
+    ("230201", "Del Rio", "Del Rio", "Texas"), ("230301", "Eagle Pass", "Bridge I", "Texas"),
+    ("230302", "Eagle Pass", "Bridge II", "Texas"), ("230401", "Laredo", "Bridge I", "Texas"),
+    ("230402", "Laredo", "Bridge II", "Texas"), ("230403", "Laredo", "Colombia Solidarity", "Texas"),
+    ("230404", "Laredo", "World Trade Bridge", "Texas"), ("231001", "Roma", "Roma", "Texas"),
+    ("230701", "Rio Grande City", "Rio Grande City", "Texas"), ("230901", "Progreso", "Progreso", "Texas"),
+    ("230501", "Hidalgo/Pharr", "Hidalgo", "Texas"), ("230502", "Hidalgo/Pharr", "Pharr", "Texas"),
+    ("230503", "Hidalgo/Pharr", "Anzalduas", "Texas"), ("535501", "Brownsville", "Gateway", "Texas"),
+    ("535502", "Brownsville", "Veterans International", "Texas"), ("535503", "Brownsville", "Los Tomates", "Texas"),
+    ("535504", "Brownsville", "B&M", "Texas"),
+    ("300401", "Blaine", "Peace Arch", "Washington"), ("300402", "Blaine", "Pacific Highway", "Washington"),
+    ("300403", "Blaine", "Point Roberts", "Washington"), ("302301", "Lynden", "Lynden", "Washington"),
+    ("300901", "Sumas", "Sumas", "Washington"), ("302501", "Oroville", "Oroville", "Washington"),
+    ("302201", "Laurier", "Laurier", "Washington"), ("330901", "Sweetgrass", "Sweetgrass", "Montana"),
+    ("340101", "Pembina", "Pembina", "North Dakota"), ("340301", "Portal", "Portal", "North Dakota"),
+    ("360401", "International Falls", "International Falls", "Minnesota"),
+    ("380301", "Sault Ste. Marie", "Sault Ste. Marie", "Michigan"), ("380001", "Detroit", "Ambassador Bridge", "Michigan"),
+    ("380002", "Detroit", "Windsor Tunnel", "Michigan"), ("380201", "Port Huron", "Blue Water Bridge", "Michigan"),
+    ("090101", "Buffalo/Niagara Falls", "Peace Bridge", "New York"),
+    ("090102", "Buffalo/Niagara Falls", "Rainbow Bridge", "New York"),
+    ("090103", "Buffalo/Niagara Falls", "Lewiston Bridge", "New York"),
+    ("090104", "Buffalo/Niagara Falls", "Whirlpool Bridge", "New York"),
+    ("071201", "Champlain", "Champlain", "New York"), ("070801", "Alexandria Bay", "Thousand Islands Bridge", "New York"),
+    ("070101", "Ogdensburg", "Ogdensburg", "New York"), ("070401", "Massena", "Massena", "New York"),
+    ("020901", "Derby Line", "I-91", "Vermont"), ("021201", "Highgate Springs", "Highgate Springs", "Vermont"),
+    ("011501", "Calais", "Ferry Point", "Maine"), ("011502", "Calais", "International Avenue", "Maine"),
+    ("010601", "Houlton", "Houlton", "Maine"), ("010901", "Madawaska", "Madawaska", "Maine"),
+    ("010401", "Jackman", "Jackman", "Maine"),
+]
+TYPICAL_PORTS = 120
+
+
+def _lane(rng, closed_share=0.1):
+    roll = rng.random()
+    if roll < closed_share:
+        return {"update_time": "", "operational_status": "Lanes Closed", "delay_minutes": "", "lanes_open": ""}
+    if roll < closed_share * 2:
+        return {"update_time": "", "operational_status": "N/A", "delay_minutes": "N/A", "lanes_open": "N/A"}
+    hour = rng.randint(1, 12)
+    delay = int(rng.expovariate(1 / 25))
+    return {
+        "update_time": f"At {hour}:00 {rng.choice(['am', 'pm'])} {rng.choice(['PDT', 'MDT', 'CDT', 'EDT'])}",
+        "operational_status": "no delay" if delay == 0 else "delay",
+        "delay_minutes": str(delay),
+        "lanes_open": str(rng.randint(1, 12)),
+    }
+
+
+def _port(rng, code, port_name, crossing_name, state, date):
+    border = "Canadian Border" if code[:2] in ("30", "33", "34", "36", "38", "09", "07", "02", "01") else "Mexican Border"
+    port = {
+        "port_code": code,
+        "border": border,
+        "port_name": port_name,
+        "crossing_name": crossing_name,
+        "state": state,
+        "hours": rng.choice(["24 hrs/day", "6 am-10 pm", "8 am-Midnight"]),
+        "date": date,
+        "port_status": "Open",
+        "construction_notice": rng.choice(["", "", "", "Lane reductions due to construction."]),
+    }
+    # About one port in twelve has no <time>, which is what marks a row stale.
+    if rng.random() > 1 / 12:
+        port["time"] = f"{rng.randint(0, 23)}:00:00"
+    port["commercial_vehicle_lanes"] = {
+        "maximum_lanes": str(rng.randint(0, 10)),
+        "standard_lanes": _lane(rng),
+        "FAST_lanes": _lane(rng, closed_share=0.3),
+    }
+    port["passenger_vehicle_lanes"] = {
+        "maximum_lanes": str(rng.randint(2, 26)),
+        "standard_lanes": _lane(rng),
+        "NEXUS_SENTRI_lanes": _lane(rng, closed_share=0.2),
+        "ready_lanes": _lane(rng, closed_share=0.2),
+    }
+    pedestrian = {
+        "maximum_lanes": str(rng.randint(0, 12)),
+        "standard_lanes": _lane(rng),
+        "ready_lanes": _lane(rng, closed_share=0.3),
+    }
+    if border == "Mexican Border" and rng.random() < 0.3:
+        pedestrian["sentri_lanes"] = _lane(rng)
+        pedestrian["ready_sentri_lanes"] = _lane(rng)
+    port["pedestrian_lanes"] = pedestrian
+    return port
+
+
+def synthetic_feed(n_ports, seed=0, date="5/19/2025"):
+    rng = random.Random(seed)
+    ports = []
+    for i in range(n_ports):
+        code, port_name, crossing_name, state = CROSSINGS[i % len(CROSSINGS)]
+        if i >= len(CROSSINGS):
+            # Second pass reuses the ports with their other crossing types.
+            code = f"{code[:4]}{(int(code[4:]) + 50 * (i // len(CROSSINGS))) % 100:02d}"
+            crossing_name = f"{crossing_name} {['Commercial', 'Pedestrian', 'Ready Lane'][i // len(CROSSINGS) % 3]}"
+        ports.append(_port(rng, code, port_name, crossing_name, state, date))
+    feed = {
+        "border_wait_time": {
+            "last_updated_date": "2025-5-19",
+            "last_updated_time": "13:02:39",
+            "number_of_ports": str(n_ports),
+            "port": ports,
+        }
+    }
+    return xmltodict.unparse(feed, pretty=True).encode()
+
+
+def inflate(content, n_ports, seed=0):
+    # Repeat the 120-port feed's ports under fresh port codes, shuffling the
+    # lane readings between copies so values aren't byte-identical.
+    rng = random.Random(seed)
+    data = xmltodict.parse(content)
+    template = data["border_wait_time"]["port"]
+    ports = []
+    for i in range(n_ports):
+        port = dict(template[i % len(template)])
+        port["port_code"] = f"{900000 + i:06d}"
+        donor = template[rng.randrange(len(template))]
+        for group in ("passenger_vehicle_lanes", "commercial_vehicle_lanes", "pedestrian_lanes"):
+            if isinstance(donor.get(group), dict):
+                port[group] = donor[group]
+        ports.append(port)
+    data["border_wait_time"]["port"] = ports
+    data["border_wait_time"]["number_of_ports"] = str(n_ports)
+    return xmltodict.unparse(data, pretty=True).encode()
+
+
+def path(name):
+    return os.path.join(FIXTURES_DIR, name)
+
+
+def load(name):
+    # Fixture bytes by file name; the inflated feed is built on first use.
+    if name == INFLATED and not os.path.exists(path(INFLATED)):
+        with open(path(TYPICAL), "rb") as f:
+            content = inflate(f.read(), INFLATED_PORTS)
+        with open(path(INFLATED), "wb") as f:
+            f.write(content)
+    with open(path(name), "rb") as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate the bwt.xml benchmark fixtures.")
+    parser.add_argument("--record", action="store_true", help=f"also capture CBP_URL as {RECORDED}")
+    args = parser.parse_args()
+
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    with open(path(SMALL), "wb") as f:
+        f.write(synthetic_feed(5, seed=1))
+    with open(path(TYPICAL), "wb") as f:
+        f.write(synthetic_feed(TYPICAL_PORTS, seed=2))
+    names = [SMALL, TYPICAL, INFLATED]
+    if args.record:
+        import requests
+
+        import border_app
+
+        with open(path(RECORDED), "wb") as f:
+            f.write(requests.get(border_app.CBP_URL, timeout=30).content)
+        names.append(RECORDED)
+    if os.path.exists(path(INFLATED)):
+        os.remove(path(INFLATED))
+    load(INFLATED)
+    for name in names:
+        print(f"{name}: {os.path.getsize(path(name)) / 1e3:.0f} kB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,92 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-import requests
-import uvicorn
+import httpx
 import os
+import asyncio
+import importlib.util
+import logging
+import hashlib
+import time
 import xmltodict
-from supabase import create_client, Client
+import history_store
+import history_export
+import baseline
+import forecast
+import spatial_index
+import recommend
+import metrics
+import applog
+import parallel_feed
+import schema_drift
+import shared_snapshot
+import snapshot_file
+import storage
+
+logger = applog.get_logger("border_app")
 
 def clean_value(val):
     if val is None or isinstance(val, str) and val.strip() in ("", "N/A", "Lanes Closed"):
         return None
     return val
 
-app = FastAPI()
+# Point at benchmarks/fake_cbp.py to run against recorded snapshots offline.
+CBP_URL = os.getenv("CBP_URL", "https://bwt.cbp.gov/xml/bwt.xml")
+CBP_TIMEOUT = float(os.getenv("CBP_TIMEOUT", "20"))
+CBP_MAX_CONNECTIONS = int(os.getenv("CBP_MAX_CONNECTIONS", "10"))
+SNAPSHOT_TTL = int(os.getenv("SNAPSHOT_TTL", "60"))
+# Last built snapshot (snapshot_file format), so a restart serves at once
+# instead of waiting on CBP and re-parsing.
+SNAPSHOT_CACHE_PATH = os.getenv("SNAPSHOT_CACHE_PATH", "bwt_snapshot.bin")
+# How long startup waits on CBP when there is no SNAPSHOT_CACHE_PATH yet.
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "15"))
+# After a failed cold start, CBP is retried in the background from the first
+# delay, doubling up to the max, until a snapshot is installed.
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "2"))
+WARMUP_RETRY_MAX_SECONDS = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", "60"))
+# With several uvicorn workers, one of them refreshes from CBP and the rest
+# pick up its snapshot from SNAPSHOT_CACHE_PATH (see shared_snapshot.py).
+# On by default when WEB_CONCURRENCY, which uvicorn reads for --workers, is > 1.
+SNAPSHOT_SHARED = os.getenv(
+    "SNAPSHOT_SHARED", "1" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "0"
+) == "1"
+
+_http = {"client": None}
+
+def _new_http_client():
+    # One pooled client for every CBP fetch: keep-alive connections, HTTP/2
+    # when the h2 package is installed, and a hard cap on upstream sockets.
+    return httpx.AsyncClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_connections=CBP_MAX_CONNECTIONS, max_keepalive_connections=CBP_MAX_CONNECTIONS),
+        timeout=CBP_TIMEOUT,
+    )
+
+def http_client():
+    # Created in the lifespan; the fallback covers callers that never start it.
+    if _http["client"] is None:
+        _http["client"] = _new_http_client()
+    return _http["client"]
+
+@asynccontextmanager
+async def lifespan(app):
+    _http["client"] = _new_http_client()
+    await warm_up()
+    try:
+        yield
+    finally:
+        tasks = list(_refresh_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        client, _http["client"] = _http["client"], None
+        await client.aclose()
+        parallel_feed.shutdown()
+        metrics.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Consider specifying allowed origins in production
@@ -19,349 +94,795 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-CBP_URL = "https://bwt.cbp.gov/xml/bwt.xml"
+# Without Supabase credentials (or HISTORY_STORAGE) we record into the local
+# history store only. The Supabase client itself is created on first record.
+history_storage = storage.from_env()
+
+_snapshot = {
+    "fetched_at": 0.0, "changed_at": 0.0, "digest": None, "payload": None, "by_code": {}, "source": None,
+    "validators": None,
+}
+_snapshot_lock = asyncio.Lock()
+_shared = shared_snapshot.SharedSnapshot(SNAPSHOT_CACHE_PATH) if SNAPSHOT_SHARED else None
+# Strong references to background refreshes until they finish.
+_refresh_tasks = set()
+
+async def fetch_feed(timer=None, validators=None):
+    # Upstream errors raise instead of being parsed as XML -- httpx counts any
+    # non-2xx, a 304 included, as one. With validators (the ETag and
+    # Last-Modified of a body the caller still has) the request is
+    # conditional and a 304 comes back as-is, with an empty body.
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    if timer is None:
+        response = await http_client().get(CBP_URL, headers=headers)
+    else:
+        with timer.time():
+            response = await http_client().get(CBP_URL, headers=headers)
+    if response.status_code == 304 and headers:
+        return response
+    response.raise_for_status()
+    return response
+
+def _validators(response):
+    return {"etag": response.headers.get("etag"), "last_modified": response.headers.get("last-modified")}
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Border Wait Times API is live. Go to /wait-times"}
 
+def normalize_port(port, diagnostics=None):
+    passenger = port.get("passenger_vehicle_lanes", {}).get("standard_lanes", {})
+    passenger_ready = port.get("passenger_vehicle_lanes", {}).get("ready_lanes", {})
+    passenger_sentri = port.get("passenger_vehicle_lanes", {}).get("NEXUS_SENTRI_lanes", {})
+
+    commercial = port.get("commercial_vehicle_lanes", {}).get("standard_lanes", {})
+    commercial_fast = port.get("commercial_vehicle_lanes", {}).get("FAST_lanes", {})
+
+    pedestrian = port.get("pedestrian_lanes", {}).get("standard_lanes", {})
+    pedestrian_ready = port.get("pedestrian_lanes", {}).get("ready_lanes", {})
+    pedestrian_sentri = port.get("pedestrian_lanes", {}).get("sentri_lanes", {})
+    pedestrian_ready_sentri = port.get("pedestrian_lanes", {}).get("ready_sentri_lanes", {})
+
+    item = {
+        "crossing_name": port.get("crossing_name", ""),
+        "port_name": port.get("port_name", ""),
+        "port_code": port.get("port_code", ""),
+        "state": port.get("state", ""),
+        "region": port.get("region", ""),
+        "hours": port.get("hours", ""),
+        "border": port.get("border", ""),
+        "date": port.get("date") or None,
+        "time": port.get("time") or None,
+        "notice": port.get("construction_notice", ""),
+        "note": port.get("note", ""),
+        "port_status": port.get("port_status", ""),
+
+        "passenger_standard_delay_minutes": clean_value(passenger.get("delay_minutes")),
+        "passenger_standard_lanes_open": clean_value(passenger.get("lanes_open")),
+        "passenger_standard_update_time": clean_value(passenger.get("update_time")),
+
+        "passenger_ready_delay_minutes": clean_value(passenger_ready.get("delay_minutes")),
+        "passenger_ready_lanes_open": clean_value(passenger_ready.get("lanes_open")),
+        "passenger_ready_update_time": clean_value(passenger_ready.get("update_time")),
+
+        "passenger_sentri_delay_minutes": clean_value(passenger_sentri.get("delay_minutes")),
+        "passenger_sentri_lanes_open": clean_value(passenger_sentri.get("lanes_open")),
+        "passenger_sentri_update_time": clean_value(passenger_sentri.get("update_time")),
+
+        "commercial_standard_delay_minutes": clean_value(commercial.get("delay_minutes")),
+        "commercial_standard_lanes_open": clean_value(commercial.get("lanes_open")),
+        "commercial_standard_update_time": clean_value(commercial.get("update_time")),
+
+        "commercial_fast_delay_minutes": clean_value(commercial_fast.get("delay_minutes")),
+        "commercial_fast_lanes_open": clean_value(commercial_fast.get("lanes_open")),
+        "commercial_fast_update_time": clean_value(commercial_fast.get("update_time")),
+
+        "pedestrian_standard_delay_minutes": clean_value(pedestrian.get("delay_minutes")),
+        "pedestrian_standard_lanes_open": clean_value(pedestrian.get("lanes_open")),
+        "pedestrian_standard_update_time": clean_value(pedestrian.get("update_time")),
+
+        "pedestrian_ready_delay_minutes": clean_value(pedestrian_ready.get("delay_minutes")),
+        "pedestrian_ready_lanes_open": clean_value(pedestrian_ready.get("lanes_open")),
+        "pedestrian_ready_update_time": clean_value(pedestrian_ready.get("update_time")),
+
+        "pedestrian_sentri_delay_minutes": clean_value(pedestrian_sentri.get("delay_minutes")),
+        "pedestrian_sentri_lanes_open": clean_value(pedestrian_sentri.get("lanes_open")),
+        "pedestrian_sentri_update_time": clean_value(pedestrian_sentri.get("update_time")),
+
+        "pedestrian_ready_sentri_delay_minutes": clean_value(pedestrian_ready_sentri.get("delay_minutes")),
+        "pedestrian_ready_sentri_lanes_open": clean_value(pedestrian_ready_sentri.get("lanes_open")),
+        "pedestrian_ready_sentri_update_time": clean_value(pedestrian_ready_sentri.get("update_time")),
+        "full_xml": port,
+    }
+
+    if diagnostics is not None:
+        for lane, detail in (
+            ("passenger_ready", passenger_ready),
+            ("passenger_sentri", passenger_sentri),
+            ("commercial_standard", commercial),
+            ("commercial_fast", commercial_fast),
+            ("pedestrian_standard", pedestrian),
+            ("pedestrian_ready", pedestrian_ready),
+            ("pedestrian_sentri", pedestrian_sentri),
+            ("pedestrian_ready_sentri", pedestrian_ready_sentri),
+        ):
+            if not detail:
+                diagnostics["missing_lanes"].setdefault(lane, []).append(item["port_name"])
+
+    if logger.isEnabledFor(logging.DEBUG) and applog.sampled("normalize_port"):
+        logger.debug("normalized port (sampled)", extra=applog.fields(
+            port_code=item["port_code"],
+            port_name=item["port_name"],
+            lanes={k: v for k, v in item.items() if k.endswith(("_delay_minutes", "_lanes_open"))},
+        ))
+
+    # Normalize empty strings to None (keep 0 intact)
+    item = {k: (v if v not in ("", None) else None) if not isinstance(v, (int, float)) else v for k, v in item.items()}
+
+    # Add nested lane structures for frontend
+    item["passenger_vehicle_lanes"] = {
+        "standard_lanes": {
+            "delay_minutes": item.pop("passenger_standard_delay_minutes"),
+            "lanes_open": item.pop("passenger_standard_lanes_open"),
+        },
+        "ready_lanes": {
+            "delay_minutes": item.pop("passenger_ready_delay_minutes"),
+            "lanes_open": item.pop("passenger_ready_lanes_open"),
+        },
+        "sentri_lanes": {
+            "delay_minutes": item.pop("passenger_sentri_delay_minutes"),
+            "lanes_open": item.pop("passenger_sentri_lanes_open"),
+        },
+    }
+    item["commercial_vehicle_lanes"] = {
+        "standard_lanes": {
+            "delay_minutes": item.pop("commercial_standard_delay_minutes"),
+            "lanes_open": item.pop("commercial_standard_lanes_open"),
+        },
+        "FAST_lanes": {
+            "delay_minutes": item.pop("commercial_fast_delay_minutes"),
+            "lanes_open": item.pop("commercial_fast_lanes_open"),
+        },
+    }
+    item["pedestrian_lanes"] = {
+        "standard_lanes": {
+            "delay_minutes": item.pop("pedestrian_standard_delay_minutes"),
+            "lanes_open": item.pop("pedestrian_standard_lanes_open"),
+        },
+        "ready_lanes": {
+            "delay_minutes": item.pop("pedestrian_ready_delay_minutes"),
+            "lanes_open": item.pop("pedestrian_ready_lanes_open"),
+        },
+        "sentri_lanes": {
+            "delay_minutes": item.pop("pedestrian_sentri_delay_minutes"),
+            "lanes_open": item.pop("pedestrian_sentri_lanes_open"),
+        },
+        "ready_sentri_lanes": {
+            "delay_minutes": item.pop("pedestrian_ready_sentri_delay_minutes"),
+            "lanes_open": item.pop("pedestrian_ready_sentri_lanes_open"),
+        },
+    }
+
+    return item
+
+def build_snapshot(content):
+    # Large bodies (multi-source or archived feeds) parse and normalize
+    # across processes; see parallel_feed.py.
+    if parallel_feed.enabled(content):
+        with metrics.SNAPSHOT_PARSE_PARALLEL.time():
+            data, summary, diagnostics = parallel_feed.normalize(content)
+    else:
+        with metrics.SNAPSHOT_PARSE.time():
+            data = xmltodict.parse(content)
+            ports = data.get("border_wait_time", {}).get("port", [])
+        diagnostics = {"missing_lanes": {}}
+        with metrics.SNAPSHOT_NORMALIZE.time():
+            summary = [normalize_port(port, diagnostics) for port in ports]
+    # One summary record per snapshot instead of a line per port and lane.
+    logger.info("snapshot normalized", extra=applog.fields(
+        ports=len(summary),
+        missing_lanes={lane: len(names) for lane, names in diagnostics["missing_lanes"].items()},
+        missing_lane_examples={lane: names[:5] for lane, names in diagnostics["missing_lanes"].items()},
+    ))
+    try:
+        with metrics.SNAPSHOT_SCHEMA.time():
+            schema_drift.check(data)
+    except Exception:
+        logger.exception("schema drift check failed")
+    with metrics.SNAPSHOT_BASELINE.time():
+        baseline.annotate(summary)
+    return {
+        "ports_found": len(summary),
+        "all_ports_summary": summary
+    }
+
+def _refresh_forecast(payload):
+    try:
+        with metrics.SNAPSHOT_FORECAST.time():
+            forecast.refresh(payload["all_ports_summary"])
+    except Exception:
+        logger.exception("forecast refresh failed")
+
+def rebuild_snapshot(content, digest=None):
+    # Everything a new feed body costs -- parse, normalize, baseline and
+    # forecast -- in one call so it can run off the event loop. With a digest
+    # the result is also written to SNAPSHOT_CACHE_PATH for the next start.
+    payload = build_snapshot(content)
+    _refresh_forecast(payload)
+    if digest is not None:
+        try:
+            snapshot_file.save(SNAPSHOT_CACHE_PATH, payload, digest)
+        except OSError:
+            logger.exception("could not cache snapshot", extra=applog.fields(path=SNAPSHOT_CACHE_PATH))
+    return payload
+
+def load_cached_snapshot():
+    # (payload, digest, created_at) from SNAPSHOT_CACHE_PATH, or None.
+    if not os.path.exists(SNAPSHOT_CACHE_PATH):
+        return None
+    try:
+        payload, digest, created_at = snapshot_file.load(SNAPSHOT_CACHE_PATH)
+    except Exception:
+        logger.exception("could not load cached snapshot", extra=applog.fields(path=SNAPSHOT_CACHE_PATH))
+        return None
+    _refresh_forecast(payload)
+    return payload, digest, created_at
+
+def _install(payload, digest, now, source):
+    _snapshot["payload"] = payload
+    _snapshot["by_code"] = {item["port_code"]: item for item in payload["all_ports_summary"]}
+    _snapshot["digest"] = digest
+    _snapshot["changed_at"] = now
+    _snapshot["source"] = source
+    # Set by _refresh for bodies it fetched itself.
+    _snapshot["validators"] = None
+    metrics.SNAPSHOT_PORTS.set(payload["ports_found"])
+
+def _age_to_monotonic(now, wall_time):
+    # A time.time() stamp from the snapshot file or another worker, on this
+    # process's monotonic clock.
+    return now - max(0.0, time.time() - wall_time)
+
+async def _adopt_shared(now):
+    # Take the snapshot another worker published, if it is newer than ours,
+    # and its last CBP check time.
+    _generation, checked_at, digest = _shared.read()
+    if digest is None:
+        return
+    if digest != _snapshot["digest"]:
+        cached = await run_in_threadpool(load_cached_snapshot)
+        # A mismatch means the file was replaced again since; the next lookup
+        # sees the newer control block.
+        if cached is None or cached[1] != digest:
+            return
+        payload, _digest, created_at = cached
+        metrics.SNAPSHOT_ADOPTED.inc()
+        _install(payload, digest, now, "shared")
+        _snapshot["changed_at"] = _age_to_monotonic(now, created_at)
+    _snapshot["fetched_at"] = max(_snapshot["fetched_at"], _age_to_monotonic(now, checked_at))
+
+def _fresh(now):
+    return _snapshot["payload"] is not None and now - _snapshot["fetched_at"] < SNAPSHOT_TTL
+
+async def get_snapshot():
+    # The CBP feed only changes every few minutes, so every request inside
+    # SNAPSHOT_TTL shares one fetch, and normalization plus baseline lookups run
+    # once per distinct feed body rather than once per request. While one
+    # request refreshes, the others keep getting the current snapshot instead
+    # of queueing behind a slow CBP. With SNAPSHOT_SHARED the same holds
+    # across workers: one refreshes, the others adopt what it publishes.
+    if _snapshot["payload"] is not None and _snapshot_lock.locked():
+        if _fresh(time.monotonic()):
+            metrics.SNAPSHOT_HIT.inc()
+        else:
+            metrics.SNAPSHOT_STALE.inc()
+        return _snapshot["payload"]
+    async with _snapshot_lock:
+        now = time.monotonic()
+        if _fresh(now):
+            metrics.SNAPSHOT_HIT.inc()
+            return _snapshot["payload"]
+        if _shared is None:
+            return await _refresh(now)
+
+        await _adopt_shared(now)
+        if _fresh(now):
+            metrics.SNAPSHOT_HIT.inc()
+            return _snapshot["payload"]
+        # Only block on the refresher when there is nothing to serve yet.
+        if not await run_in_threadpool(_shared.acquire, _snapshot["payload"] is None):
+            metrics.SNAPSHOT_STALE.inc()
+            return _snapshot["payload"]
+        try:
+            # The previous refresher may have published while we waited.
+            await _adopt_shared(now)
+            if _fresh(now):
+                metrics.SNAPSHOT_HIT.inc()
+                return _snapshot["payload"]
+            return await _refresh(now)
+        finally:
+            _shared.release()
+
+def _serve_stale(now, message, error):
+    # Keep serving what we have (possibly the disk copy from warm-up) and
+    # retry once SNAPSHOT_TTL has passed.
+    metrics.SNAPSHOT_STALE.inc()
+    logger.warning(message, extra=applog.fields(error=repr(error)))
+    _snapshot["fetched_at"] = now
+    if _shared is not None:
+        _shared.publish(_snapshot["digest"], time.time())
+    return _snapshot["payload"]
+
+async def _refresh(now):
+    # Fetch from CBP under _snapshot_lock (and the shared refresher lock).
+    # A failed fetch or a body that doesn't build (a 200 with truncated or
+    # malformed XML) leaves the current snapshot in place.
+    try:
+        response = await fetch_feed(
+            metrics.SNAPSHOT_FETCH, _snapshot["validators"] if _snapshot["payload"] is not None else None,
+        )
+    except Exception as e:
+        if _snapshot["payload"] is None:
+            raise
+        return _serve_stale(now, "feed fetch failed, serving previous snapshot", e)
+    if response.status_code == 304:
+        digest = _snapshot["digest"]
+    else:
+        digest = hashlib.sha1(response.content).hexdigest()
+    if digest != _snapshot["digest"]:
+        try:
+            payload = await run_in_threadpool(rebuild_snapshot, response.content, digest)
+        except Exception as e:
+            if _snapshot["payload"] is None:
+                raise
+            return _serve_stale(now, "feed rebuild failed, serving previous snapshot", e)
+        metrics.SNAPSHOT_REBUILT.inc()
+        _install(payload, digest, now, "live")
+    else:
+        metrics.SNAPSHOT_UNCHANGED.inc()
+        _snapshot["source"] = "live"
+    if response.status_code != 304:
+        _snapshot["validators"] = _validators(response)
+    _snapshot["fetched_at"] = now
+    if _shared is not None:
+        _shared.publish(digest, time.time())
+    return _snapshot["payload"]
+
+async def _background_refresh():
+    try:
+        await get_snapshot()
+    except Exception as e:
+        logger.warning("background refresh failed", extra=applog.fields(error=repr(e)))
+
+async def _retry_until_ready():
+    # Nothing else refreshes while /readyz is 503 behind a readiness-gated
+    # router, so keep trying until there is a snapshot.
+    delay = WARMUP_RETRY_SECONDS
+    while _snapshot["payload"] is None:
+        await asyncio.sleep(delay)
+        try:
+            await get_snapshot()
+        except Exception as e:
+            delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+            logger.warning("warm-up retry failed", extra=applog.fields(error=repr(e), next_retry_seconds=delay))
+    logger.info("warm-up done", extra=applog.fields(source=_snapshot["source"], retried=True))
+
+def _start_background(coro):
+    task = asyncio.create_task(coro)
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+async def warm_up():
+    # Runs in the lifespan before uvicorn accepts connections. A snapshot
+    # saved by the previous process is loaded first -- no fetch, no parse --
+    # and marked expired, with the CBP refresh started in the background, so
+    # a restart is ready immediately however slow CBP is. Without one, wait
+    # up to WARMUP_TIMEOUT for CBP.
+    started = time.monotonic()
+    cached = await run_in_threadpool(load_cached_snapshot)
+    if cached is not None:
+        payload, digest, created_at = cached
+        async with _snapshot_lock:
+            if _snapshot["payload"] is None:
+                now = time.monotonic()
+                _install(payload, digest, now, "disk")
+                _snapshot["changed_at"] = _age_to_monotonic(now, created_at)
+                _snapshot["fetched_at"] = 0.0
+        logger.info("warm-up done", extra=applog.fields(
+            source="disk", seconds=round(time.monotonic() - started, 3),
+            snapshot_age_seconds=round(time.time() - created_at, 1),
+        ))
+        _start_background(_background_refresh())
+        return
+
+    try:
+        await asyncio.wait_for(get_snapshot(), WARMUP_TIMEOUT)
+        logger.info("warm-up done", extra=applog.fields(
+            source="live", seconds=round(time.monotonic() - started, 3),
+        ))
+    except Exception as e:
+        logger.warning("warm-up fetch failed, starting cold", extra=applog.fields(error=repr(e)))
+        _start_background(_retry_until_ready())
+
+@app.get("/healthz")
+async def healthz():
+    # Liveness: the process is up and serving requests.
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    # Readiness: there is a snapshot to serve.
+    if _snapshot["payload"] is None:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {
+        "status": "ready",
+        "source": _snapshot["source"],
+        "ports": _snapshot["payload"]["ports_found"],
+        "snapshot_age_seconds": round(time.monotonic() - _snapshot["changed_at"], 1),
+    }
+
 @app.get("/wait-times")
-def get_wait_times():
+async def get_wait_times():
+    try:
+        return await get_snapshot()
+    except Exception as e:
+        metrics.WAIT_TIMES_ERRORS.inc()
+        return {"error": str(e)}
+
+def _crossing_names(content):
+    data = xmltodict.parse(content)
+    ports = data.get("border_wait_time", {}).get("port", [])
+    return sorted({port.get("crossing_name", "Unknown") for port in ports})
+
+@app.get("/ports")
+async def get_all_ports():
+    try:
+        response = await fetch_feed()
+        port_names = await run_in_threadpool(_crossing_names, response.content)
+        return {"available_ports": port_names}
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.get("/nearby")
+async def get_nearby(lat: float, lon: float, k: int = 5, max_km: float = spatial_index.NEARBY_MAX_KM):
+    # Crossings within max_km, closest first. Snapshot ports missing from
+    # port_coords.json can't be placed and come back under "unlocated".
+    try:
+        if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+            return {"error": "lat must be within [-90, 90] and lon within [-180, 180]"}
+        k = max(1, min(k, 50))
+
+        await get_snapshot()
+        by_code = _snapshot["by_code"]
+        registry = spatial_index.registry()
+        nearby = []
+        for port_code, distance_km in spatial_index.nearest(lat, lon, k, max_km):
+            info = registry[port_code]
+            item = by_code.get(port_code)
+            nearby.append({
+                "port_code": port_code,
+                "crossing_name": info["crossing_name"],
+                "port_name": info["port_name"],
+                "lat": info["lat"],
+                "lon": info["lon"],
+                "distance_km": distance_km,
+                "port_status": item.get("port_status") if item else None,
+                "delays": {
+                    lane: delay for lane in history_store.LANES
+                    if (delay := baseline.lane_delay(item, lane)) is not None
+                } if item else None,
+            })
+        return {"nearby": nearby, "unlocated": spatial_index.unlocated(by_code)}
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.get("/recommend")
+async def get_recommendation(
+    lat: float, lon: float, lane: str = "passenger_standard", max_km: float = spatial_index.NEARBY_MAX_KM,
+):
+    try:
+        if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+            return {"error": "lat must be within [-90, 90] and lon within [-180, 180]"}
+        if lane not in history_store.LANES:
+            return {"error": f"Unknown lane '{lane}'. Expected one of: {', '.join(history_store.LANES)}"}
+
+        await get_snapshot()
+        by_code = _snapshot["by_code"]
+        return {
+            "lane": lane,
+            "recommendations": recommend.rank(lat, lon, lane, by_code, max_km=max_km),
+            "unlocated": spatial_index.unlocated(by_code),
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.get("/ports/{port_code}/history")
+def get_port_history(
+    port_code: str,
+    start: str = Query(None, alias="from"),
+    end: str = Query(None, alias="to"),
+    lane: str = "passenger_standard",
+    resolution: str = "1h",
+):
     try:
-        response = requests.get(CBP_URL)
-        data = xmltodict.parse(response.content)
-        ports = data.get("border_wait_time", {}).get("port", [])
-
-        summary = []
-        for port in ports:
-            passenger = port.get("passenger_vehicle_lanes", {}).get("standard_lanes", {})
-            passenger_ready = port.get("passenger_vehicle_lanes", {}).get("ready_lanes", {})
-            if not passenger_ready:
-                print(f"⚠️ No 'passenger_ready' data for: {port.get('port_name')}")
-            passenger_sentri = port.get("passenger_vehicle_lanes", {}).get("NEXUS_SENTRI_lanes", {})
-            if not passenger_sentri:
-                print(f"⚠️ No 'passenger_sentri' data for: {port.get('port_name')}")
-
-            commercial = port.get("commercial_vehicle_lanes", {}).get("standard_lanes", {})
-            if not commercial:
-                print(f"⚠️ No 'commercial_standard' data for: {port.get('port_name')}")
-            commercial_fast = port.get("commercial_vehicle_lanes", {}).get("FAST_lanes", {})
-            if not commercial_fast:
-                print(f"⚠️ No 'commercial_fast' data for: {port.get('port_name')}")
-
-            pedestrian = port.get("pedestrian_lanes", {}).get("standard_lanes", {})
-            if not pedestrian:
-                print(f"⚠️ No 'pedestrian_standard' data for: {port.get('port_name')}")
-            pedestrian_ready = port.get("pedestrian_lanes", {}).get("ready_lanes", {})
-            if not pedestrian_ready:
-                print(f"⚠️ No 'pedestrian_ready' data for: {port.get('port_name')}")
-            pedestrian_sentri = port.get("pedestrian_lanes", {}).get("sentri_lanes", {})
-            if not pedestrian_sentri:
-                print(f"⚠️ No 'pedestrian_sentri' data for: {port.get('port_name')}")
-            pedestrian_ready_sentri = port.get("pedestrian_lanes", {}).get("ready_sentri_lanes", {})
-            if not pedestrian_ready_sentri:
-                print(f"⚠️ No 'pedestrian_ready_sentri' data for: {port.get('port_name')}")
-
-            item = {
-                "crossing_name": port.get("crossing_name", ""),
-                "port_name": port.get("port_name", ""),
-                "port_code": port.get("port_code", ""),
-                "state": port.get("state", ""),
-                "region": port.get("region", ""),
-                "hours": port.get("hours", ""),
-                "border": port.get("border", ""),
-                "date": port.get("date") or None,
-                "time": port.get("time") or None,
-                "notice": port.get("construction_notice", ""),
-                "note": port.get("note", ""),
-                "port_status": port.get("port_status", ""),
-
-                "passenger_standard_delay_minutes": clean_value(passenger.get("delay_minutes")),
-                "passenger_standard_lanes_open": clean_value(passenger.get("lanes_open")),
-                "passenger_standard_update_time": clean_value(passenger.get("update_time")),
-
-                "passenger_ready_delay_minutes": clean_value(passenger_ready.get("delay_minutes")),
-                "passenger_ready_lanes_open": clean_value(passenger_ready.get("lanes_open")),
-                "passenger_ready_update_time": clean_value(passenger_ready.get("update_time")),
-
-                "passenger_sentri_delay_minutes": clean_value(passenger_sentri.get("delay_minutes")),
-                "passenger_sentri_lanes_open": clean_value(passenger_sentri.get("lanes_open")),
-                "passenger_sentri_update_time": clean_value(passenger_sentri.get("update_time")),
-
-                "commercial_standard_delay_minutes": clean_value(commercial.get("delay_minutes")),
-                "commercial_standard_lanes_open": clean_value(commercial.get("lanes_open")),
-                "commercial_standard_update_time": clean_value(commercial.get("update_time")),
-
-                "commercial_fast_delay_minutes": clean_value(commercial_fast.get("delay_minutes")),
-                "commercial_fast_lanes_open": clean_value(commercial_fast.get("lanes_open")),
-                "commercial_fast_update_time": clean_value(commercial_fast.get("update_time")),
-
-                "pedestrian_standard_delay_minutes": clean_value(pedestrian.get("delay_minutes")),
-                "pedestrian_standard_lanes_open": clean_value(pedestrian.get("lanes_open")),
-                "pedestrian_standard_update_time": clean_value(pedestrian.get("update_time")),
-
-                "pedestrian_ready_delay_minutes": clean_value(pedestrian_ready.get("delay_minutes")),
-                "pedestrian_ready_lanes_open": clean_value(pedestrian_ready.get("lanes_open")),
-                "pedestrian_ready_update_time": clean_value(pedestrian_ready.get("update_time")),
-
-                "pedestrian_sentri_delay_minutes": clean_value(pedestrian_sentri.get("delay_minutes")),
-                "pedestrian_sentri_lanes_open": clean_value(pedestrian_sentri.get("lanes_open")),
-                "pedestrian_sentri_update_time": clean_value(pedestrian_sentri.get("update_time")),
-
-                "pedestrian_ready_sentri_delay_minutes": clean_value(pedestrian_ready_sentri.get("delay_minutes")),
-                "pedestrian_ready_sentri_lanes_open": clean_value(pedestrian_ready_sentri.get("lanes_open")),
-                "pedestrian_ready_sentri_update_time": clean_value(pedestrian_ready_sentri.get("update_time")),
-                "full_xml": port,
-            }
-
-            if item["port_name"] == "Nogales":
-                print("🧪 Debug Nogales:", {
-                    "passenger_standard": {
-                        "delay": item["passenger_standard_delay_minutes"],
-                        "lanes": item["passenger_standard_lanes_open"],
-                        "update": item["passenger_standard_update_time"]
-                    },
-                    "passenger_ready": {
-                        "delay": item["passenger_ready_delay_minutes"],
-                        "lanes": item["passenger_ready_lanes_open"],
-                        "update": item["passenger_ready_update_time"]
-                    },
-                    "passenger_sentri": {
-                        "delay": item["passenger_sentri_delay_minutes"],
-                        "lanes": item["passenger_sentri_lanes_open"],
-                        "update": item["passenger_sentri_update_time"]
-                    },
-                    "commercial_standard": {
-                        "delay": item["commercial_standard_delay_minutes"],
-                        "lanes": item["commercial_standard_lanes_open"],
-                        "update": item["commercial_standard_update_time"]
-                    },
-                    "commercial_fast": {
-                        "delay": item["commercial_fast_delay_minutes"],
-                        "lanes": item["commercial_fast_lanes_open"],
-                        "update": item["commercial_fast_update_time"]
-                    },
-                    "pedestrian_standard": {
-                        "delay": item["pedestrian_standard_delay_minutes"],
-                        "lanes": item["pedestrian_standard_lanes_open"],
-                        "update": item["pedestrian_standard_update_time"]
-                    },
-                    "pedestrian_ready": {
-                        "delay": item["pedestrian_ready_delay_minutes"],
-                        "lanes": item["pedestrian_ready_lanes_open"],
-                        "update": item["pedestrian_ready_update_time"]
-                    },
-                    "pedestrian_sentri": {
-                        "delay": item["pedestrian_sentri_delay_minutes"],
-                        "lanes": item["pedestrian_sentri_lanes_open"],
-                        "update": item["pedestrian_sentri_update_time"]
-                    },
-                    "pedestrian_ready_sentri": {
-                        "delay": item["pedestrian_ready_sentri_delay_minutes"],
-                        "lanes": item["pedestrian_ready_sentri_lanes_open"],
-                        "update": item["pedestrian_ready_sentri_update_time"]
-                    }
-                })
-
-            # Normalize empty strings to None (keep 0 intact)
-            item = {k: (v if v not in ("", None) else None) if not isinstance(v, (int, float)) else v for k, v in item.items()}
-
-            # Add nested lane structures for frontend
-            item["passenger_vehicle_lanes"] = {
-                "standard_lanes": {
-                    "delay_minutes": item.pop("passenger_standard_delay_minutes"),
-                    "lanes_open": item.pop("passenger_standard_lanes_open"),
-                },
-                "ready_lanes": {
-                    "delay_minutes": item.pop("passenger_ready_delay_minutes"),
-                    "lanes_open": item.pop("passenger_ready_lanes_open"),
-                },
-                "sentri_lanes": {
-                    "delay_minutes": item.pop("passenger_sentri_delay_minutes"),
-                    "lanes_open": item.pop("passenger_sentri_lanes_open"),
-                },
-            }
-            item["commercial_vehicle_lanes"] = {
-                "standard_lanes": {
-                    "delay_minutes": item.pop("commercial_standard_delay_minutes"),
-                    "lanes_open": item.pop("commercial_standard_lanes_open"),
-                },
-                "FAST_lanes": {
-                    "delay_minutes": item.pop("commercial_fast_delay_minutes"),
-                    "lanes_open": item.pop("commercial_fast_lanes_open"),
-                },
-            }
-            item["pedestrian_lanes"] = {
-                "standard_lanes": {
-                    "delay_minutes": item.pop("pedestrian_standard_delay_minutes"),
-                    "lanes_open": item.pop("pedestrian_standard_lanes_open"),
-                },
-                "ready_lanes": {
-                    "delay_minutes": item.pop("pedestrian_ready_delay_minutes"),
-                    "lanes_open": item.pop("pedestrian_ready_lanes_open"),
-                },
-                "sentri_lanes": {
-                    "delay_minutes": item.pop("pedestrian_sentri_delay_minutes"),
-                    "lanes_open": item.pop("pedestrian_sentri_lanes_open"),
-                },
-                "ready_sentri_lanes": {
-                    "delay_minutes": item.pop("pedestrian_ready_sentri_delay_minutes"),
-                    "lanes_open": item.pop("pedestrian_ready_sentri_lanes_open"),
-                },
-            }
-
-            # Log if important delay or lane data is missing, with enhanced logging for which field and value
-            for k, v in item.items():
-                if ("delay" in k or "lanes_open" in k) and v is None:
-                    print(f"⚠️ None value for {k} at port {item['port_name']}: expected a value but got None")
-
-            known_keys = {
-                "crossing_name", "port_name", "port_code", "state", "region", "hours", "border",
-                "date", "time", "construction_notice", "note", "port_status",
-                "passenger_vehicle_lanes", "commercial_vehicle_lanes", "pedestrian_lanes"
-            }
-            unknown_keys = set(port.keys()) - known_keys
-            if unknown_keys:
-                print(f"🔍 Unparsed keys found at {port.get('port_name')}: {unknown_keys}")
-
-            summary.append(item)
+        if lane not in history_store.LANES:
+            return {"error": f"Unknown lane '{lane}'. Expected one of: {', '.join(history_store.LANES)}"}
+        if resolution != "raw" and resolution not in history_store.RESOLUTIONS:
+            return {"error": f"Unknown resolution '{resolution}'. Expected raw, {', '.join(history_store.RESOLUTIONS)}"}
+
+        start_ts = history_store.parse_bound(start)
+        end_ts = history_store.parse_bound(end)
+        points = history_store.query_series(port_code, lane, resolution, start_ts, end_ts)
+        return {
+            "port_code": port_code,
+            "lane": lane,
+            "resolution": resolution,
+            "from": start_ts,
+            "to": end_ts,
+            "summary": history_store.summarize(port_code, lane, start_ts, end_ts),
+            "points": points,
+        }
+    except Exception as e:
+        return {"error": str(e)}
 
+@app.get("/ports/{port_code}/percentiles")
+def get_port_percentiles(
+    port_code: str,
+    start: str = Query(None, alias="from"),
+    end: str = Query(None, alias="to"),
+    lane: str = "passenger_standard",
+    q: str = "0.5,0.9",
+):
+    try:
+        if lane not in history_store.LANES:
+            return {"error": f"Unknown lane '{lane}'. Expected one of: {', '.join(history_store.LANES)}"}
+        qs = [float(part) for part in q.split(",") if part.strip()]
+        if any(not 0 <= value <= 1 for value in qs):
+            return {"error": "Quantiles must be between 0 and 1"}
+
+        start_ts = history_store.parse_bound(start)
+        end_ts = history_store.parse_bound(end)
+        sketch = history_store.merged_sketch(port_code, lane, start_ts, end_ts)
         return {
-            "ports_found": len(summary),
-            "all_ports_summary": summary
+            "port_code": port_code,
+            "lane": lane,
+            "from": start_ts,
+            "to": end_ts,
+            "count": sketch.n,
+            "quantiles": {f"p{value * 100:g}": sketch.quantile(value) for value in qs},
         }
+    except Exception as e:
+        return {"error": str(e)}
 
+@app.get("/export")
+async def export_rows(
+    format: str = "csv",
+    start: str = Query(None, alias="from"),
+    end: str = Query(None, alias="to"),
+    source: str = "history",
+    port_code: str = None,
+):
+    # Row dump as CSV or NDJSON. source=history pages through the local
+    # history store (history_store.iter_history), so the body is produced
+    # as it is sent and memory stays flat for any range; source=current is
+    # the live snapshot in the same columns.
+    try:
+        if format not in history_export.TEXT_FORMATS:
+            return {"error": f"Unknown format '{format}'. Expected one of: {', '.join(history_export.TEXT_FORMATS)}"}
+        if source == "history":
+            start_ts = history_store.parse_bound(start)
+            end_ts = history_store.parse_bound(end)
+            pages = history_store.iter_history(
+                start_ts, end_ts, port_code, history_export.TEXT_COLUMNS, history_export.EXPORT_PAGE_ROWS,
+            )
+        elif source == "current":
+            payload = await get_snapshot()
+            rows = [
+                history_store.to_db_row(build_history_row(item["full_xml"]))
+                for item in payload["all_ports_summary"]
+                if port_code is None or item["port_code"] == port_code
+            ]
+            pages = [[tuple(row[c] for c in history_export.TEXT_COLUMNS) for row in rows]]
+        else:
+            return {"error": f"Unknown source '{source}'. Expected history or current"}
+        return StreamingResponse(
+            history_export.text_chunks(format, pages),
+            media_type=history_export.TEXT_FORMATS[format],
+            headers={"Content-Disposition": f'attachment; filename="bwt_{source}.{format}"'},
+        )
     except Exception as e:
         return {"error": str(e)}
 
-@app.get("/ports")
-def get_all_ports():
+@app.get("/exports/history")
+def list_history_exports():
     try:
-        response = requests.get(CBP_URL)
-        data = xmltodict.parse(response.content)
-        ports = data.get("border_wait_time", {}).get("port", [])
-        port_names = sorted({port.get("crossing_name", "Unknown") for port in ports})
-        return {"available_ports": port_names}
+        return {"partitions": history_export.list_partitions()}
     except Exception as e:
         return {"error": str(e)}
 
+_EXPORT_MEDIA_TYPES = {"parquet": "application/vnd.apache.parquet", "arrow": "application/vnd.apache.arrow.file"}
+
+@app.get("/exports/history/{month}/{port_code}")
+def get_history_export(month: str, port_code: str, format: str = "parquet"):
+    # One month of one port as a columnar file (see history_export.py),
+    # written on first request and streamed from disk.
+    try:
+        target = history_export.partition(month, port_code, format)
+        if target is None:
+            return {"error": f"No history for port {port_code} in {month}"}
+        return FileResponse(
+            target, media_type=_EXPORT_MEDIA_TYPES[format], filename=f"bwt_history_{port_code}_{month}.{format}",
+        )
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.get("/ports/{port_code}/forecast")
+async def get_port_forecast(port_code: str):
+    try:
+        await get_snapshot()
+        result = forecast.get(port_code)
+        if result is None:
+            return {"error": f"No forecast available for port {port_code}"}
+        return result
+    except Exception as e:
+        return {"error": str(e)}
+
+def build_history_row(port, stale_ports=None):
+    port_code = port.get("port_code")
+    cbp_date = port.get("date")
+    cbp_time = port.get("time")
+
+    if not cbp_time:
+        cbp_time = (
+            port.get("passenger_vehicle_lanes", {})
+                .get("standard_lanes", {})
+                .get("update_time")
+        )
+
+    # Collected by the caller and logged once per run; the raw port is only
+    # dumped for a sample at debug level.
+    if cbp_time is None:
+        if stale_ports is not None:
+            stale_ports.append(port.get("port_name"))
+        if logger.isEnabledFor(logging.DEBUG) and applog.sampled("stale_port"):
+            logger.debug("raw port without cbp_time (sampled)", extra=applog.fields(port=port))
+
+    is_stale = cbp_time is None
+
+    if is_stale:
+        cbp_time = "00:00"
+
+    # Build initial item dict, now including full_xml for all records
+    item = {
+        "crossing_name": port.get("crossing_name", ""),
+        "port_name": port.get("port_name", ""),
+        "port_code": port_code,
+        "state": port.get("state", ""),
+        "region": port.get("region", ""),
+        "hours": port.get("hours", ""),
+        "border": port.get("border", ""),
+        "date": cbp_date or None,
+        "time": cbp_time,  # ensure this is set to "00:00" if cbp_time was None above
+        "notice": port.get("construction_notice", ""),
+        "note": port.get("note", ""),
+        "port_status": port.get("port_status", ""),
+
+        "passenger_standard_delay_minutes": clean_value(port.get("passenger_vehicle_lanes", {}).get("standard_lanes", {}).get("delay_minutes")),
+        "passenger_standard_lanes_open": clean_value(port.get("passenger_vehicle_lanes", {}).get("standard_lanes", {}).get("lanes_open")),
+        "passenger_standard_update_time": clean_value(port.get("passenger_vehicle_lanes", {}).get("standard_lanes", {}).get("update_time")),
+
+        "passenger_ready_delay_minutes": clean_value(port.get("passenger_vehicle_lanes", {}).get("ready_lanes", {}).get("delay_minutes")),
+        "passenger_ready_lanes_open": clean_value(port.get("passenger_vehicle_lanes", {}).get("ready_lanes", {}).get("lanes_open")),
+        "passenger_ready_update_time": clean_value(port.get("passenger_vehicle_lanes", {}).get("ready_lanes", {}).get("update_time")),
+
+        "passenger_sentri_delay_minutes": clean_value(port.get("passenger_vehicle_lanes", {}).get("NEXUS_SENTRI_lanes", {}).get("delay_minutes")),
+        "passenger_sentri_lanes_open": clean_value(port.get("passenger_vehicle_lanes", {}).get("NEXUS_SENTRI_lanes", {}).get("lanes_open")),
+        "passenger_sentri_update_time": clean_value(port.get("passenger_vehicle_lanes", {}).get("NEXUS_SENTRI_lanes", {}).get("update_time")),
+
+        "commercial_standard_delay_minutes": clean_value(port.get("commercial_vehicle_lanes", {}).get("standard_lanes", {}).get("delay_minutes")),
+        "commercial_standard_lanes_open": clean_value(port.get("commercial_vehicle_lanes", {}).get("standard_lanes", {}).get("lanes_open")),
+        "commercial_standard_update_time": clean_value(port.get("commercial_vehicle_lanes", {}).get("standard_lanes", {}).get("update_time")),
+
+        "commercial_fast_delay_minutes": clean_value(port.get("commercial_vehicle_lanes", {}).get("FAST_lanes", {}).get("delay_minutes")),
+        "commercial_fast_lanes_open": clean_value(port.get("commercial_vehicle_lanes", {}).get("FAST_lanes", {}).get("lanes_open")),
+        "commercial_fast_update_time": clean_value(port.get("commercial_vehicle_lanes", {}).get("FAST_lanes", {}).get("update_time")),
+
+        "pedestrian_standard_delay_minutes": clean_value(port.get("pedestrian_lanes", {}).get("standard_lanes", {}).get("delay_minutes")),
+        "pedestrian_standard_lanes_open": clean_value(port.get("pedestrian_lanes", {}).get("standard_lanes", {}).get("lanes_open")),
+        "pedestrian_standard_update_time": clean_value(port.get("pedestrian_lanes", {}).get("standard_lanes", {}).get("update_time")),
+
+        "pedestrian_ready_delay_minutes": clean_value(port.get("pedestrian_lanes", {}).get("ready_lanes", {}).get("delay_minutes")),
+        "pedestrian_ready_lanes_open": clean_value(port.get("pedestrian_lanes", {}).get("ready_lanes", {}).get("lanes_open")),
+        "pedestrian_ready_update_time": clean_value(port.get("pedestrian_lanes", {}).get("ready_lanes", {}).get("update_time")),
+
+        "pedestrian_sentri_delay_minutes": clean_value(port.get("pedestrian_lanes", {}).get("sentri_lanes", {}).get("delay_minutes")),
+        "pedestrian_sentri_lanes_open": clean_value(port.get("pedestrian_lanes", {}).get("sentri_lanes", {}).get("lanes_open")),
+        "pedestrian_sentri_update_time": clean_value(port.get("pedestrian_lanes", {}).get("sentri_lanes", {}).get("update_time")),
+
+        "pedestrian_ready_sentri_delay_minutes": clean_value(port.get("pedestrian_lanes", {}).get("ready_sentri_lanes", {}).get("delay_minutes")),
+        "pedestrian_ready_sentri_lanes_open": clean_value(port.get("pedestrian_lanes", {}).get("ready_sentri_lanes", {}).get("lanes_open")),
+        "pedestrian_ready_sentri_update_time": clean_value(port.get("pedestrian_lanes", {}).get("ready_sentri_lanes", {}).get("update_time")),
+        "stale": is_stale,
+        "full_xml": port,
+    }
+
+    # Clean values (normalize empty strings to None, but preserve "00:00" for time)
+    cleaned_item = {k: (v if v not in ("", None) else None) if not isinstance(v, (int, float)) else v for k, v in item.items()}
+    # Explicitly ensure time is set to cbp_time (which is "00:00" if it was None originally)
+    cleaned_item["time"] = cbp_time
+
+    if cleaned_item["time"] is None:
+        cleaned_item["time"] = "00:00"
+    return cleaned_item
+
+def record_rows(content):
+    # Parse, build rows and write them; runs in the threadpool since both the
+    # local SQLite store and the storage backends are blocking.
+    if parallel_feed.enabled(content):
+        with metrics.RECORD_PARSE_PARALLEL.time():
+            rows, stale_ports = parallel_feed.history_rows(content)
+    else:
+        with metrics.RECORD_PARSE.time():
+            data = xmltodict.parse(content)
+            ports = data.get("border_wait_time", {}).get("port", [])
+        stale_ports = []
+        with metrics.RECORD_NORMALIZE.time():
+            rows = [build_history_row(port, stale_ports) for port in ports]
+    if stale_ports:
+        logger.warning("ports without cbp_time, recorded as stale", extra=applog.fields(
+            count=len(stale_ports), ports=stale_ports,
+        ))
+
+    # Local store first: it dedups on (port_code, date, time) by itself and
+    # backfills rows the remote store already has when the local file is new.
+    with metrics.RECORD_LOCAL_STORE.time():
+        local_inserted = history_store.insert_rows(rows)
+    metrics.RECORD_LOCAL_INSERTED.inc(local_inserted)
+
+    if history_storage is None:
+        inserted, skipped = local_inserted, len(rows) - local_inserted
+    else:
+        with metrics.RECORD_REMOTE_STORE.time():
+            inserted, skipped = history_storage.insert_new(rows)
+    metrics.RECORD_INSERTED.inc(inserted)
+    metrics.RECORD_SKIPPED.inc(skipped)
+
+    return {"inserted": inserted, "skipped": skipped, "local_inserted": local_inserted}
+
 @app.post("/record-wait-times")
-def record_wait_times():
+async def record_wait_times():
     try:
-        response = requests.get(CBP_URL)
-        data = xmltodict.parse(response.content)
-        ports = data.get("border_wait_time", {}).get("port", [])
-        inserted = 0
-        skipped = 0
-
-        for port in ports:
-            port_code = port.get("port_code")
-            cbp_date = port.get("date")
-            cbp_time = port.get("time")
-
-            if not cbp_time:
-                cbp_time = (
-                    port.get("passenger_vehicle_lanes", {})
-                        .get("standard_lanes", {})
-                        .get("update_time")
-                )
-
-            # Add diagnostic logging before checking if cbp_time is None
-            if cbp_time is None:
-                print(f"⚠️ No cbp_time found for port: {port.get('port_name')}")
-                print(f"🔎 Raw port: {port}")
-
-            is_stale = cbp_time is None
-
-            if is_stale:
-                cbp_time = "00:00"
-
-            # Check if entry already exists
-            existing = supabase.table("border_wait_history") \
-                .select("id") \
-                .eq("port_code", port_code) \
-                .eq("date", cbp_date) \
-                .eq("time", cbp_time) \
-                .execute()
-
-            if existing.data:
-                skipped += 1
-                continue
-
-            # Build initial item dict, now including full_xml for all records
-            item = {
-                "crossing_name": port.get("crossing_name", ""),
-                "port_name": port.get("port_name", ""),
-                "port_code": port_code,
-                "state": port.get("state", ""),
-                "region": port.get("region", ""),
-                "hours": port.get("hours", ""),
-                "border": port.get("border", ""),
-                "date": cbp_date or None,
-                "time": cbp_time,  # ensure this is set to "00:00" if cbp_time was None above
-                "notice": port.get("construction_notice", ""),
-                "note": port.get("note", ""),
-                "port_status": port.get("port_status", ""),
-
-                "passenger_standard_delay_minutes": clean_value(port.get("passenger_vehicle_lanes", {}).get("standard_lanes", {}).get("delay_minutes")),
-                "passenger_standard_lanes_open": clean_value(port.get("passenger_vehicle_lanes", {}).get("standard_lanes", {}).get("lanes_open")),
-                "passenger_standard_update_time": clean_value(port.get("passenger_vehicle_lanes", {}).get("standard_lanes", {}).get("update_time")),
-
-                "passenger_ready_delay_minutes": clean_value(port.get("passenger_vehicle_lanes", {}).get("ready_lanes", {}).get("delay_minutes")),
-                "passenger_ready_lanes_open": clean_value(port.get("passenger_vehicle_lanes", {}).get("ready_lanes", {}).get("lanes_open")),
-                "passenger_ready_update_time": clean_value(port.get("passenger_vehicle_lanes", {}).get("ready_lanes", {}).get("update_time")),
-
-                "passenger_sentri_delay_minutes": clean_value(port.get("passenger_vehicle_lanes", {}).get("NEXUS_SENTRI_lanes", {}).get("delay_minutes")),
-                "passenger_sentri_lanes_open": clean_value(port.get("passenger_vehicle_lanes", {}).get("NEXUS_SENTRI_lanes", {}).get("lanes_open")),
-                "passenger_sentri_update_time": clean_value(port.get("passenger_vehicle_lanes", {}).get("NEXUS_SENTRI_lanes", {}).get("update_time")),
-
-                "commercial_standard_delay_minutes": clean_value(port.get("commercial_vehicle_lanes", {}).get("standard_lanes", {}).get("delay_minutes")),
-                "commercial_standard_lanes_open": clean_value(port.get("commercial_vehicle_lanes", {}).get("standard_lanes", {}).get("lanes_open")),
-                "commercial_standard_update_time": clean_value(port.get("commercial_vehicle_lanes", {}).get("standard_lanes", {}).get("update_time")),
-
-                "commercial_fast_delay_minutes": clean_value(port.get("commercial_vehicle_lanes", {}).get("FAST_lanes", {}).get("delay_minutes")),
-                "commercial_fast_lanes_open": clean_value(port.get("commercial_vehicle_lanes", {}).get("FAST_lanes", {}).get("lanes_open")),
-                "commercial_fast_update_time": clean_value(port.get("commercial_vehicle_lanes", {}).get("FAST_lanes", {}).get("update_time")),
-
-                "pedestrian_standard_delay_minutes": clean_value(port.get("pedestrian_lanes", {}).get("standard_lanes", {}).get("delay_minutes")),
-                "pedestrian_standard_lanes_open": clean_value(port.get("pedestrian_lanes", {}).get("standard_lanes", {}).get("lanes_open")),
-                "pedestrian_standard_update_time": clean_value(port.get("pedestrian_lanes", {}).get("standard_lanes", {}).get("update_time")),
-
-                "pedestrian_ready_delay_minutes": clean_value(port.get("pedestrian_lanes", {}).get("ready_lanes", {}).get("delay_minutes")),
-                "pedestrian_ready_lanes_open": clean_value(port.get("pedestrian_lanes", {}).get("ready_lanes", {}).get("lanes_open")),
-                "pedestrian_ready_update_time": clean_value(port.get("pedestrian_lanes", {}).get("ready_lanes", {}).get("update_time")),
-
-                "pedestrian_sentri_delay_minutes": clean_value(port.get("pedestrian_lanes", {}).get("sentri_lanes", {}).get("delay_minutes")),
-                "pedestrian_sentri_lanes_open": clean_value(port.get("pedestrian_lanes", {}).get("sentri_lanes", {}).get("lanes_open")),
-                "pedestrian_sentri_update_time": clean_value(port.get("pedestrian_lanes", {}).get("sentri_lanes", {}).get("update_time")),
-
-                "pedestrian_ready_sentri_delay_minutes": clean_value(port.get("pedestrian_lanes", {}).get("ready_sentri_lanes", {}).get("delay_minutes")),
-                "pedestrian_ready_sentri_lanes_open": clean_value(port.get("pedestrian_lanes", {}).get("ready_sentri_lanes", {}).get("lanes_open")),
-                "pedestrian_ready_sentri_update_time": clean_value(port.get("pedestrian_lanes", {}).get("ready_sentri_lanes", {}).get("update_time")),
-                "stale": is_stale,
-                "full_xml": port,
-            }
-
-            # Clean values (normalize empty strings to None, but preserve "00:00" for time)
-            cleaned_item = {k: (v if v not in ("", None) else None) if not isinstance(v, (int, float)) else v for k, v in item.items()}
-            # Explicitly ensure time is set to cbp_time (which is "00:00" if it was None originally)
-            cleaned_item["time"] = cbp_time
-
-            if cleaned_item["time"] is None:
-                cleaned_item["time"] = "00:00"
-            supabase.table("border_wait_history").insert(cleaned_item).execute()
-            inserted += 1
-
-        return {"inserted": inserted, "skipped": skipped}
+        response = await fetch_feed(metrics.RECORD_FETCH)
+        return await run_in_threadpool(record_rows, response.content)
+    except Exception as e:
+        metrics.RECORD_ERRORS.inc()
+        return {"error": str(e)}
 
+@app.get("/schema-drift")
+def get_schema_drift():
+    try:
+        return schema_drift.report()
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/metrics")
+async def get_metrics():
+    # Set per scrape rather than read through a callback, which the
+    # multi-worker collector cannot see.
+    metrics.SNAPSHOT_AGE.set(
+        time.monotonic() - _snapshot["changed_at"] if _snapshot["payload"] is not None else 0.0
+    )
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
+    import uvicorn
+
     port = int(os.environ.get("PORT", 10000))
-    print(f"✅ Starting app on port {port}")
+    logger.info("starting app", extra=applog.fields(port=port))
     uvicorn.run("border_app:app", host="0.0.0.0", port=port)
\ No newline at end of file
@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+import baseline
+import history_matrix
+import history_store
+
+# Short-horizon forecast: the hour-of-week median baseline per port and lane,
+# plus the current deviation from it decaying at a per-lane rate (an AR(1) on
+# the residuals). Everything is fitted and evaluated as arrays over all ports
+# at once; the HTTP layer only reads precomputed results.
+#
+# Forecast points carry the fitted baseline as seasonal_delay_minutes /
+# seasonal_delay_p90: percentiles of hourly means from the rollups. They are
+# not the usual_delay_* of /wait-times, which come from the per-slot sketches
+# of raw readings (baseline.annotate).
+
+HORIZON_MINUTES = np.array([30, 60, 90, 120, 180, 240])
+TRAIN_WEEKS = int(os.getenv("FORECAST_TRAIN_WEEKS", "8"))
+REFIT_SECONDS = int(os.getenv("FORECAST_REFIT_SECONDS", "3600"))
+DEFAULT_PHI = 0.5
+
+_model = {"fitted_at": 0.0, "ports": {}, "profile": None, "upper": None, "phi": None}
+_forecasts = {}
+_lock = threading.Lock()
+
+
+def fit(cube):
+    # Returns (profile, upper, phi): profile and upper are the hour-of-week
+    # p50/p90, shaped (ports, lanes, 168); phi is (ports, lanes).
+    profile, upper = baseline.fit_batch(cube)
+    weeks = cube.shape[2] // history_matrix.HOURS_PER_WEEK
+    residual = cube - np.tile(profile, (1, 1, weeks))
+    prev, curr = residual[..., :-1], residual[..., 1:]
+    pairs = ~(np.isnan(prev) | np.isnan(curr))
+    num = np.where(pairs, prev * curr, 0.0).sum(axis=2)
+    den = np.where(pairs, prev * prev, 0.0).sum(axis=2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        phi = np.where(den > 0, num / np.maximum(den, 1e-9), DEFAULT_PHI)
+    phi = np.clip(phi, 0.0, 0.95)
+    return profile, upper, phi
+
+
+def _refit_if_stale():
+    now = time.monotonic()
+    if _model["profile"] is not None and now - _model["fitted_at"] < REFIT_SECONDS:
+        return
+    ports, _, cube = history_matrix.load_cube(TRAIN_WEEKS)
+    if not ports:
+        return
+    profile, upper, phi = fit(cube)
+    _model.update(
+        fitted_at=now,
+        ports={code: i for i, code in enumerate(ports)},
+        profile=profile,
+        upper=upper,
+        phi=phi,
+    )
+
+
+def _at_hours(table, port_rows, hows):
+    # table (ports, lanes, 168), hows (n, k) -> (n, lanes, k)
+    rows = table[port_rows]
+    index = np.broadcast_to(hows[:, None, :], rows.shape[:2] + hows.shape[1:])
+    return np.take_along_axis(rows, index, axis=2)
+
+
+def predict(profile, phi, port_rows, now_ts, current):
+    # port_rows (n,), now_ts (n,), current (n, lanes) -> (n, lanes, horizons).
+    target_ts = now_ts[:, None] + HORIZON_MINUTES[None, :] * 60
+    target_how = (target_ts // 3600 + 72) % history_matrix.HOURS_PER_WEEK
+    now_how = (now_ts[:, None] // 3600 + 72) % history_matrix.HOURS_PER_WEEK
+
+    seasonal = _at_hours(profile, port_rows, target_how)
+    residual = np.nan_to_num(current - _at_hours(profile, port_rows, now_how)[..., 0])
+    decay = phi[port_rows][..., None] ** (HORIZON_MINUTES[None, None, :] / 60.0)
+    return np.clip(seasonal + residual[..., None] * decay, 0.0, None)
+
+
+def _rounded(value):
+    return None if np.isnan(value) else round(float(value), 1)
+
+
+def refresh(summary):
+    # Called once per new snapshot with the normalized /wait-times items.
+    with _lock:
+        _refit_if_stale()
+        if _model["profile"] is None:
+            return
+
+        items, port_rows, now_ts, current = [], [], [], []
+        for item in summary:
+            row = _model["ports"].get(item.get("port_code"))
+            ts = history_store.parse_ts(item.get("date"), item.get("time"))
+            if row is None or ts is None:
+                continue
+            delays = []
+            for lane in history_store.LANES:
+                value = baseline.lane_delay(item, lane)
+                delays.append(np.nan if value is None else value)
+            items.append(item)
+            port_rows.append(row)
+            now_ts.append(ts)
+            current.append(delays)
+        if not items:
+            return
+
+        now_ts = np.array(now_ts, dtype=np.int64)
+        port_rows = np.array(port_rows)
+        values = predict(_model["profile"], _model["phi"], port_rows, now_ts, np.array(current))
+        target_how = ((now_ts[:, None] + HORIZON_MINUTES[None, :] * 60) // 3600 + 72) % history_matrix.HOURS_PER_WEEK
+        seasonal = _at_hours(_model["profile"], port_rows, target_how)
+        upper = _at_hours(_model["upper"], port_rows, target_how)
+
+        forecasts = {}
+        for i, item in enumerate(items):
+            lanes = {}
+            for j, lane in enumerate(history_store.LANES):
+                if np.isnan(values[i, j]).all():
+                    continue
+                lanes[lane] = [
+                    {
+                        "minutes_ahead": int(minutes),
+                        "ts": int(now_ts[i] + minutes * 60),
+                        "delay_minutes": _rounded(v),
+                        "seasonal_delay_minutes": _rounded(s),
+                        "seasonal_delay_p90": _rounded(p),
+                    }
+                    for minutes, v, s, p in zip(HORIZON_MINUTES, values[i, j], seasonal[i, j], upper[i, j])
+                ]
+            forecasts[item["port_code"]] = {
+                "port_code": item["port_code"],
+                "issued_ts": int(now_ts[i]),
+                "lanes": lanes,
+            }
+        _forecasts.clear()
+        _forecasts.update(forecasts)
+
+
+def get(port_code):
+    return _forecasts.get(port_code)
+
+
+def delay_at(port_code, lane, minutes_ahead, current=None):
+    # Forecast delay minutes_ahead from the snapshot, linearly interpolated
+    # between horizons and anchored at the current reading when there is one.
+    # Returns None when the port/lane has no forecast.
+    points = ((_forecasts.get(port_code) or {}).get("lanes") or {}).get(lane)
+    if not points:
+        return None
+    xs = [p["minutes_ahead"] for p in points if p["delay_minutes"] is not None]
+    ys = [p["delay_minutes"] for p in points if p["delay_minutes"] is not None]
+    if current is not None:
+        xs.insert(0, 0)
+        ys.insert(0, current)
+    if not xs:
+        return None
+    return round(float(np.interp(minutes_ahead, xs, ys)), 1)
@@ -0,0 +1,295 @@
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+import history_store
+
+# Columnar export of the local history store for analysts, one file per
+# (month, port) in hive-style directories under one root per format:
+#
+#   EXPORT_DIR/parquet/month=2025-05/port_code=250401/part-0.parquet
+#
+# so pyarrow.dataset, pandas, DuckDB or Spark can read years of history from
+# EXPORT_DIR/parquet and prune by month or port from the paths alone. Rows are long, one per reading
+# and lane with data:
+#
+#   port_code      dictionary<int32, string>
+#   lane           dictionary<int8, string>   (history_store.LANES)
+#   ts             timestamp[s]               port-local wall clock, as stored
+#   delay_minutes  int16, null when not reported
+#   lanes_open     int16, null when not reported
+#   stale          bool
+#
+# Formats: "parquet" (zstd) or "arrow" (the Arrow IPC file format, readable
+# with memory mapping). pyarrow is imported on first use, so processes that
+# never export don't load it. Read the tree back with dataset(): it declares
+# the partition keys as strings, which keeps leading zeros in port codes and
+# matches the port_code column inside the files.
+#
+#   python history_export.py --from 2024-01-01 --to 2025-01-01
+#
+# Row dumps for GET /export are text: CSV or NDJSON with the
+# border_wait_history columns, encoded one page of rows at a time.
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+FORMATS = ("parquet", "arrow")
+# Partitions of a month that may still get rows are rewritten once older
+# than this; finished months are written once.
+EXPORT_REFRESH_SECONDS = int(os.getenv("EXPORT_REFRESH_SECONDS", "3600"))
+
+TEXT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# full_xml is left out of row dumps: it is the raw feed, several KB per row.
+TEXT_COLUMNS = tuple(c for c in history_store.COLUMNS if c != "full_xml")
+EXPORT_PAGE_ROWS = int(os.getenv("EXPORT_PAGE_ROWS", "5000"))
+
+_MONTH = re.compile(r"^\d{4}-\d{2}$")
+_PORT_CODE = re.compile(r"^[\w-]+$")
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("Columnar export needs pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def month_label(month_ts):
+    return datetime.fromtimestamp(month_ts, timezone.utc).strftime("%Y-%m")
+
+
+def parse_month(label):
+    if not _MONTH.match(label or ""):
+        raise ValueError(f"Invalid month '{label}'. Expected YYYY-MM")
+    return int(datetime.strptime(label, "%Y-%m").replace(tzinfo=timezone.utc).timestamp())
+
+
+def partition_path(month_ts, port_code, fmt="parquet", out_dir=None):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'. Expected one of: {', '.join(FORMATS)}")
+    if not _PORT_CODE.match(port_code or ""):
+        raise ValueError(f"Invalid port code '{port_code}'")
+    return os.path.join(
+        out_dir or EXPORT_DIR, fmt, f"month={month_label(month_ts)}", f"port_code={port_code}", f"part-0.{fmt}",
+    )
+
+
+def _month_end(month_ts):
+    return history_store.month_start(month_ts + 32 * history_store.RESOLUTIONS["1d"])
+
+
+def months(start_ts=None, end_ts=None, path=None):
+    # Month starts with at least one row in [start_ts, end_ts).
+    conn = history_store.connect(path)
+    low, high = conn.execute(
+        "SELECT MIN(ts), MAX(ts) FROM border_wait_history "
+        "WHERE ts IS NOT NULL AND ts >= ? AND ts < ?",
+        (start_ts if start_ts is not None else -(2 ** 62), end_ts if end_ts is not None else 2 ** 62),
+    ).fetchone()
+    if low is None:
+        return []
+    found, month = [], history_store.month_start(low)
+    while month <= high:
+        found.append(month)
+        month = _month_end(month)
+    return found
+
+
+def _schema(pa):
+    return pa.schema([
+        ("port_code", pa.dictionary(pa.int32(), pa.string())),
+        ("lane", pa.dictionary(pa.int8(), pa.string())),
+        ("ts", pa.timestamp("s")),
+        ("delay_minutes", pa.int16()),
+        ("lanes_open", pa.int16()),
+        ("stale", pa.bool_()),
+    ])
+
+
+def _tables(month_ts, port_code=None, path=None):
+    # {port_code: pyarrow.Table} for one month, optionally one port.
+    pa = _pyarrow()
+    conn = history_store.connect(path)
+    lane_cols = ", ".join(f"{lane}_delay_minutes, {lane}_lanes_open" for lane in history_store.LANES)
+    sql = (
+        f"SELECT port_code, ts, stale, {lane_cols} FROM border_wait_history "
+        f"WHERE ts >= ? AND ts < ?"
+    )
+    params = [month_ts, _month_end(month_ts)]
+    if port_code is not None:
+        sql += " AND port_code = ?"
+        params.append(port_code)
+    sql += " ORDER BY port_code, ts"
+
+    schema = _schema(pa)
+    lanes = pa.array(history_store.LANES, pa.string())
+    columns = {}
+    for row in conn.execute(sql, params):
+        code, ts, stale, *values = tuple(row)
+        cols = columns.get(code)
+        if cols is None:
+            cols = columns[code] = {"lane": [], "ts": [], "delay_minutes": [], "lanes_open": [], "stale": []}
+        for i, lane in enumerate(history_store.LANES):
+            delay = history_store.as_minutes(values[2 * i])
+            lanes_open = history_store.as_minutes(values[2 * i + 1])
+            if delay is None and lanes_open is None:
+                continue
+            cols["lane"].append(i)
+            cols["ts"].append(ts)
+            cols["delay_minutes"].append(delay)
+            cols["lanes_open"].append(lanes_open)
+            cols["stale"].append(bool(stale))
+
+    tables = {}
+    for code, cols in columns.items():
+        n = len(cols["ts"])
+        tables[code] = pa.Table.from_arrays([
+            pa.DictionaryArray.from_arrays(pa.array([0] * n, pa.int32()), pa.array([code], pa.string())),
+            pa.DictionaryArray.from_arrays(pa.array(cols["lane"], pa.int8()), lanes),
+            pa.array(cols["ts"], pa.timestamp("s")),
+            pa.array(cols["delay_minutes"], pa.int16()),
+            pa.array(cols["lanes_open"], pa.int16()),
+            pa.array(cols["stale"], pa.bool_()),
+        ], schema=schema)
+    return tables
+
+
+def _write(table, target, fmt):
+    pa = _pyarrow()
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # Per process and thread: two requests may build the same partition.
+    tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if fmt == "parquet":
+        pa.parquet.write_table(table, tmp_path, compression="zstd")
+    else:
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, target)
+
+
+def _needs_write(target, month_ts, force):
+    if force or not os.path.exists(target):
+        return True
+    written = os.path.getmtime(target)
+    # A day of margin: ts is port-local wall clock, written is real time.
+    month_open = written < _month_end(month_ts) + history_store.RESOLUTIONS["1d"]
+    return month_open and time.time() - written > EXPORT_REFRESH_SECONDS
+
+
+def export_month(month_ts, fmt="parquet", out_dir=None, port_code=None, force=False, path=None):
+    # Writes the month's partitions that are missing or out of date. Returns
+    # one {"month", "port_code", "path", "rows", "written"} per partition.
+    results = []
+    for code, table in sorted(_tables(month_ts, port_code, path).items()):
+        target = partition_path(month_ts, code, fmt, out_dir)
+        written = _needs_write(target, month_ts, force)
+        if written:
+            _write(table, target, fmt)
+        results.append({
+            "month": month_label(month_ts), "port_code": code, "path": target,
+            "rows": table.num_rows, "written": written,
+        })
+    return results
+
+
+def partition(month_label_value, port_code, fmt="parquet", out_dir=None, path=None):
+    # Path to one partition file, (re)written first if needed; None when the
+    # port has no rows that month.
+    month_ts = parse_month(month_label_value)
+    target = partition_path(month_ts, port_code, fmt, out_dir)
+    if _needs_write(target, month_ts, force=False):
+        if not export_month(month_ts, fmt, out_dir, port_code, path=path):
+            return None
+    return target
+
+
+def text_chunks(fmt, pages, columns=TEXT_COLUMNS):
+    # One str per page of rows (tuples in `columns` order); CSV starts with
+    # a header line.
+    if fmt not in TEXT_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'. Expected one of: {', '.join(TEXT_FORMATS)}")
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(columns)
+        for page in pages:
+            writer.writerows(page)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    else:
+        for page in pages:
+            yield "".join(json.dumps(dict(zip(columns, row)), separators=(",", ":")) + "\n" for row in page)
+
+
+def dataset(fmt="parquet", out_dir=None):
+    # pyarrow.dataset.Dataset over every exported partition of fmt.
+    pa = _pyarrow()
+    partitioning = pa.dataset.partitioning(
+        pa.schema([("month", pa.string()), ("port_code", pa.dictionary(pa.int32(), pa.string()))]),
+        flavor="hive", dictionaries="infer",
+    )
+    return pa.dataset.dataset(
+        os.path.join(out_dir or EXPORT_DIR, fmt), format="ipc" if fmt == "arrow" else fmt,
+        partitioning=partitioning,
+    )
+
+
+def list_partitions(out_dir=None):
+    out_dir = out_dir or EXPORT_DIR
+    found = []
+    for fmt in FORMATS:
+        root = os.path.join(out_dir, fmt)
+        if not os.path.isdir(root):
+            continue
+        for month_dir in sorted(os.listdir(root)):
+            if not month_dir.startswith("month="):
+                continue
+            for port_dir in sorted(os.listdir(os.path.join(root, month_dir))):
+                target = os.path.join(root, month_dir, port_dir, f"part-0.{fmt}")
+                if not port_dir.startswith("port_code=") or not os.path.exists(target):
+                    continue
+                found.append({
+                    "month": month_dir.partition("=")[2],
+                    "port_code": port_dir.partition("=")[2],
+                    "format": fmt,
+                    "bytes": os.path.getsize(target),
+                })
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export border_wait_history as partitioned Parquet/Arrow files.")
+    parser.add_argument("--from", dest="start", help="epoch seconds or ISO date")
+    parser.add_argument("--to", dest="end", help="epoch seconds or ISO date")
+    parser.add_argument("--format", default="parquet", choices=FORMATS)
+    parser.add_argument("--out", default=EXPORT_DIR)
+    parser.add_argument("--force", action="store_true", help="rewrite partitions that are up to date")
+    args = parser.parse_args()
+
+    start_ts = history_store.parse_bound(args.start)
+    end_ts = history_store.parse_bound(args.end)
+    total = written = 0
+    for month_ts in months(start_ts, end_ts):
+        results = export_month(month_ts, args.format, args.out, force=args.force)
+        rows = sum(r["rows"] for r in results)
+        changed = sum(1 for r in results if r["written"])
+        total += rows
+        written += changed
+        print(f"{month_label(month_ts)}  {len(results)} ports  {rows} rows  {changed} written")
+    print(f"{total} rows, {written} partitions written under {args.out}")
+
+
+if __name__ == "__main__":
+    main()
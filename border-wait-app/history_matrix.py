@@ -0,0 +1,72 @@
+import numpy as np
+
+import history_store
+
+# Dense (ports, lanes, time buckets) views of wait-time history. Missing
+# readings -- everything clean_value() turns into None -- are NaN, so model
+# fitting is plain array math over all ports and lanes at once instead of
+# Python loops over dict rows.
+
+HOURS_PER_WEEK = 168
+WEEK = HOURS_PER_WEEK * 3600
+# Epoch 0 is a Thursday; the first Monday 00:00 is four days later.
+_WEEK_OFFSET = 4 * 24 * 3600
+
+
+def week_floor(ts):
+    return ts - (ts - _WEEK_OFFSET) % WEEK
+
+
+def load_cube(weeks, path=None):
+    # Hourly mean delay for the last `weeks` whole weeks of rollups. The window
+    # starts on a Monday 00:00 so the hour axis reshapes into (weeks, 168).
+    # Returns (ports, start_ts, cube); cube is None when the store is empty.
+    conn = history_store.connect(path)
+    latest = conn.execute(
+        "SELECT MAX(bucket_ts) FROM wait_rollups WHERE resolution = '1h'"
+    ).fetchone()[0]
+    if latest is None:
+        return [], None, None
+    start = week_floor(latest) - (weeks - 1) * WEEK
+    rows = conn.execute(
+        "SELECT port_code, lane, bucket_ts, sum, count FROM wait_rollups "
+        "WHERE resolution = '1h' AND bucket_ts >= ?",
+        (start,),
+    ).fetchall()
+
+    ports = sorted({row[0] for row in rows})
+    port_index = {code: i for i, code in enumerate(ports)}
+    lane_index = {lane: i for i, lane in enumerate(history_store.LANES)}
+    cube = np.full((len(ports), len(lane_index), weeks * HOURS_PER_WEEK), np.nan)
+    if rows:
+        n = len(rows)
+        p = np.fromiter((port_index[row[0]] for row in rows), dtype=np.intp, count=n)
+        l = np.fromiter((lane_index[row[1]] for row in rows), dtype=np.intp, count=n)
+        t = np.fromiter(((row[2] - start) // 3600 for row in rows), dtype=np.intp, count=n)
+        mean = np.fromiter((row[3] / row[4] for row in rows), dtype=float, count=n)
+        cube[p, l, t] = mean
+    return ports, start, cube
+
+
+def by_hour_of_week(cube):
+    # (ports, lanes, weeks * 168) -> (ports, lanes, weeks, 168).
+    n_ports, n_lanes, n_hours = cube.shape
+    return cube.reshape(n_ports, n_lanes, n_hours // HOURS_PER_WEEK, HOURS_PER_WEEK)
+
+
+def nan_quantiles(values, qs, axis):
+    # Linear-interpolated quantiles ignoring NaN, fully vectorized. np.nanquantile
+    # falls back to a per-slice Python loop on multi-dimensional input, which
+    # is what made it unusable here. Returns shape (len(qs),) + reduced shape.
+    ordered = np.sort(np.moveaxis(values, axis, -1), axis=-1)  # NaN sorts last
+    count = (~np.isnan(ordered)).sum(axis=-1)
+    results = []
+    for q in qs:
+        pos = q * np.maximum(count - 1, 0)
+        lo = np.floor(pos).astype(np.intp)
+        hi = np.minimum(lo + 1, np.maximum(count - 1, 0))
+        lo_v = np.take_along_axis(ordered, lo[..., None], axis=-1)[..., 0]
+        hi_v = np.take_along_axis(ordered, hi[..., None], axis=-1)[..., 0]
+        value = lo_v + (hi_v - lo_v) * (pos - lo)
+        results.append(np.where(count > 0, value, np.nan))
+    return np.stack(results)
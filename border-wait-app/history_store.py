@@ -0,0 +1,490 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from quantile_sketch import KLLSketch
+
+# Local, embedded copy of border_wait_history. Supabase stays the shared store;
+# this file lets us answer history questions without a network round trip.
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "border_wait_history.db")
+
+LANES = (
+    "passenger_standard",
+    "passenger_ready",
+    "passenger_sentri",
+    "commercial_standard",
+    "commercial_fast",
+    "pedestrian_standard",
+    "pedestrian_ready",
+    "pedestrian_sentri",
+    "pedestrian_ready_sentri",
+)
+
+TEXT_COLUMNS = (
+    "crossing_name", "port_name", "port_code", "state", "region", "hours", "border",
+    "date", "time", "notice", "note", "port_status",
+)
+
+LANE_COLUMNS = tuple(
+    f"{lane}_{field}"
+    for lane in LANES
+    for field in ("delay_minutes", "lanes_open", "update_time")
+)
+
+COLUMNS = TEXT_COLUMNS + LANE_COLUMNS + ("stale", "full_xml", "ts")
+
+# Bucket widths for the pre-aggregated delay rollups, in seconds.
+RESOLUTIONS = {
+    "15m": 15 * 60,
+    "1h": 60 * 60,
+    "1d": 24 * 60 * 60,
+}
+
+# The history table alone, keyed like the Supabase table; storage.SQLiteStorage
+# creates just this.
+HISTORY_TABLE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS border_wait_history (
+    id INTEGER PRIMARY KEY,
+    {", ".join(f"{c} TEXT" for c in TEXT_COLUMNS)},
+    {", ".join(f"{c} {'TEXT' if c.endswith('update_time') else 'INTEGER'}" for c in LANE_COLUMNS)},
+    stale INTEGER NOT NULL DEFAULT 0,
+    full_xml TEXT,
+    ts INTEGER,
+    UNIQUE (port_code, date, time)
+);
+"""
+
+_SCHEMA = HISTORY_TABLE_SCHEMA + """
+CREATE INDEX IF NOT EXISTS idx_history_port_ts ON border_wait_history (port_code, ts);
+CREATE INDEX IF NOT EXISTS idx_history_port ON border_wait_history (port_code);
+CREATE INDEX IF NOT EXISTS idx_history_ts ON border_wait_history (ts);
+CREATE TABLE IF NOT EXISTS wait_rollups (
+    port_code TEXT NOT NULL,
+    lane TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    bucket_ts INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum INTEGER NOT NULL,
+    min INTEGER NOT NULL,
+    max INTEGER NOT NULL,
+    sum_sq INTEGER NOT NULL,
+    PRIMARY KEY (port_code, lane, resolution, bucket_ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS wait_sketches (
+    port_code TEXT NOT NULL,
+    lane TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    sketch BLOB NOT NULL,
+    PRIMARY KEY (port_code, lane, scope, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sketches_scope_bucket ON wait_sketches (scope, bucket);
+CREATE TABLE IF NOT EXISTS schema_paths (
+    path TEXT PRIMARY KEY,
+    first_seen INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_schema_paths_last_seen ON schema_paths (last_seen);
+"""
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def connect(path=None):
+    # One connection per thread: FastAPI runs sync endpoints in a threadpool.
+    path = path or HISTORY_DB_PATH
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _schema_lock:
+            if path not in _schema_ready:
+                conn.executescript(_SCHEMA)
+                _schema_ready.add(path)
+        conns[path] = conn
+    return conn
+
+
+_DATE_FORMATS = ("%m/%d/%Y", "%Y-%m-%d", "%m/%d/%y")
+_TIME_FORMATS = ("%H:%M:%S", "%H:%M", "%I:%M %p", "%I:%M%p", "%I %p")
+_TZ_SUFFIX = re.compile(r"\s+[A-Z]{2,4}$")
+
+
+def parse_ts(cbp_date, cbp_time):
+    # CBP reports the port's local wall clock with no offset, so we keep it that
+    # way: the epoch value is the wall clock read as if it were UTC. Ordering and
+    # hour-of-day bucketing then line up with what travelers see at the port.
+    if not cbp_date:
+        return None
+    day = None
+    for fmt in _DATE_FORMATS:
+        try:
+            day = datetime.strptime(cbp_date.strip(), fmt)
+            break
+        except ValueError:
+            continue
+    if day is None:
+        return None
+
+    clock = (cbp_time or "00:00").strip()
+    if clock.lower().startswith("at "):
+        clock = clock[3:]
+    clock = _TZ_SUFFIX.sub("", clock).strip()
+    if clock.lower() == "noon":
+        clock = "12:00"
+    elif clock.lower() == "midnight":
+        clock = "00:00"
+
+    for fmt in _TIME_FORMATS:
+        try:
+            t = datetime.strptime(clock.upper(), fmt)
+            break
+        except ValueError:
+            continue
+    else:
+        t = datetime.strptime("00:00", "%H:%M")
+
+    stamp = day.replace(hour=t.hour, minute=t.minute, second=t.second, tzinfo=timezone.utc)
+    return int(stamp.timestamp())
+
+
+def to_db_row(item):
+    row = {c: item.get(c) for c in COLUMNS}
+    row["stale"] = 1 if item.get("stale") else 0
+    if row["full_xml"] is not None and not isinstance(row["full_xml"], str):
+        row["full_xml"] = json.dumps(row["full_xml"], separators=(",", ":"))
+    if row["ts"] is None:
+        row["ts"] = parse_ts(item.get("date"), item.get("time"))
+    return row
+
+
+_INSERT_SQL = (
+    f"INSERT OR IGNORE INTO border_wait_history ({', '.join(COLUMNS)}) "
+    f"VALUES ({', '.join(':' + c for c in COLUMNS)})"
+)
+
+
+_ROLLUP_SQL = """
+INSERT INTO wait_rollups (port_code, lane, resolution, bucket_ts, count, sum, min, max, sum_sq)
+VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)
+ON CONFLICT (port_code, lane, resolution, bucket_ts) DO UPDATE SET
+    count = count + 1,
+    sum = sum + excluded.sum,
+    min = MIN(min, excluded.min),
+    max = MAX(max, excluded.max),
+    sum_sq = sum_sq + excluded.sum_sq
+"""
+
+
+def hour_of_week(ts):
+    # Monday 00:00 is 0. ts is in the port-local wall clock (see parse_ts).
+    return (ts // 3600 + 72) % 168
+
+
+def month_start(ts):
+    stamp = datetime.fromtimestamp(ts, timezone.utc)
+    return int(stamp.replace(day=1, hour=0, minute=0, second=0).timestamp())
+
+
+def _month_ceil(ts):
+    start = month_start(ts)
+    if start == ts:
+        return ts
+    return month_start(start + 32 * RESOLUTIONS["1d"])
+
+
+def sketch_buckets(ts):
+    # Quantile sketches are kept per hour-of-week (the "usual" baseline) and per
+    # day and month so arbitrary time ranges can be answered by merging.
+    return (
+        ("how", hour_of_week(ts)),
+        ("day", ts - ts % RESOLUTIONS["1d"]),
+        ("month", month_start(ts)),
+    )
+
+
+def as_minutes(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rollup_params(row):
+    if row["ts"] is None:
+        return []
+    params = []
+    for lane in LANES:
+        delay = as_minutes(row[f"{lane}_delay_minutes"])
+        if delay is None:
+            continue
+        for resolution, width in RESOLUTIONS.items():
+            bucket = row["ts"] - row["ts"] % width
+            params.append((row["port_code"], lane, resolution, bucket, delay, delay, delay, delay * delay))
+    return params
+
+
+_SKETCH_SELECT_SQL = (
+    "SELECT sketch FROM wait_sketches WHERE port_code = ? AND lane = ? AND scope = ? AND bucket = ?"
+)
+_SKETCH_WRITE_SQL = (
+    "INSERT OR REPLACE INTO wait_sketches (port_code, lane, scope, bucket, n, sketch) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+
+def _update_sketches(conn, rows):
+    # Each touched sketch is read and written once, however many rows feed it.
+    updates = {}
+    for row in rows:
+        if row["ts"] is None:
+            continue
+        buckets = sketch_buckets(row["ts"])
+        for lane in LANES:
+            delay = as_minutes(row[f"{lane}_delay_minutes"])
+            if delay is None:
+                continue
+            for scope, bucket in buckets:
+                updates.setdefault((row["port_code"], lane, scope, bucket), []).append(delay)
+    for key, delays in updates.items():
+        found = conn.execute(_SKETCH_SELECT_SQL, key).fetchone()
+        sketch = KLLSketch.from_bytes(found[0]) if found else KLLSketch()
+        for delay in delays:
+            sketch.update(delay)
+        conn.execute(_SKETCH_WRITE_SQL, key + (sketch.n, sketch.to_bytes()))
+
+
+def insert_row(item, path=None):
+    # Returns False when (port_code, date, time) is already stored. Rollups are
+    # only touched for new rows so a re-sent reading is never counted twice.
+    conn = connect(path)
+    row = to_db_row(item)
+    with conn:
+        cur = conn.execute(_INSERT_SQL, row)
+        if cur.rowcount != 1:
+            return False
+        conn.executemany(_ROLLUP_SQL, _rollup_params(row))
+        _update_sketches(conn, [row])
+    return True
+
+
+def insert_rows(items, path=None):
+    # insert_row for a batch in one transaction; returns how many were new.
+    # Used by /record-wait-times and bulk loads, where a commit and sketch
+    # rewrite per row dominate.
+    conn = connect(path)
+    inserted = []
+    with conn:
+        for item in items:
+            row = to_db_row(item)
+            if conn.execute(_INSERT_SQL, row).rowcount == 1:
+                inserted.append(row)
+        conn.executemany(_ROLLUP_SQL, (params for row in inserted for params in _rollup_params(row)))
+        _update_sketches(conn, inserted)
+    return len(inserted)
+
+
+def iter_history(start_ts=None, end_ts=None, port_code=None, columns=None, page_size=5000, path=None):
+    # Yields lists of up to page_size rows (tuples, in `columns` order) by
+    # keyset pagination: each page restarts the query after the last key
+    # seen, so memory stays flat however large the range and no cursor is
+    # held between pages. Ordered by (ts, id) when bounded in time -- served
+    # by the ts indexes -- and by id otherwise, which keeps rows without ts
+    # (idx_history_port holds a port's rows in id order for that case).
+    cols = ", ".join(columns or COLUMNS)
+    bounded = start_ts is not None or end_ts is not None
+    where, params = [], []
+    if port_code is not None:
+        where.append("port_code = ?")
+        params.append(port_code)
+    if start_ts is not None:
+        where.append("ts >= ?")
+        params.append(start_ts)
+    if end_ts is not None:
+        where.append("ts < ?")
+        params.append(end_ts)
+    order = "ts, id" if bounded else "id"
+    after = None
+    while True:
+        conditions = list(where)
+        page_params = list(params)
+        if after is not None:
+            conditions.append("(ts, id) > (?, ?)" if bounded else "id > ?")
+            page_params.extend(after)
+        sql = f"SELECT id, ts, {cols} FROM border_wait_history"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {order} LIMIT ?"
+        rows = connect(path).execute(sql, page_params + [page_size]).fetchall()
+        if not rows:
+            return
+        last = rows[-1]
+        after = (last[1], last[0]) if bounded else (last[0],)
+        yield [tuple(row)[2:] for row in rows]
+        if len(rows) < page_size:
+            return
+
+
+def _stddev(count, total, sum_sq):
+    if not count:
+        return None
+    mean = total / count
+    return round(math.sqrt(max(sum_sq / count - mean * mean, 0.0)), 2)
+
+
+def query_series(port_code, lane, resolution, start_ts=None, end_ts=None, path=None):
+    conn = connect(path)
+    if resolution == "raw":
+        sql = (
+            f"SELECT ts, {lane}_delay_minutes AS delay_minutes, {lane}_lanes_open AS lanes_open "
+            "FROM border_wait_history WHERE port_code = ? AND ts IS NOT NULL"
+        )
+        params = [port_code]
+        ts_col = "ts"
+    else:
+        sql = (
+            "SELECT bucket_ts AS ts, count, min, max, ROUND(CAST(sum AS REAL) / count, 2) AS avg, "
+            "sum, sum_sq "
+            "FROM wait_rollups WHERE port_code = ? AND lane = ? AND resolution = ?"
+        )
+        params = [port_code, lane, resolution]
+        ts_col = "bucket_ts"
+    if start_ts is not None:
+        sql += f" AND {ts_col} >= ?"
+        params.append(start_ts)
+    if end_ts is not None:
+        sql += f" AND {ts_col} < ?"
+        params.append(end_ts)
+    sql += f" ORDER BY {ts_col}"
+    points = [dict(r) for r in conn.execute(sql, params)]
+    if resolution != "raw":
+        for point in points:
+            point["stddev"] = _stddev(point["count"], point.pop("sum"), point.pop("sum_sq"))
+    return points
+
+
+def _ceil_to(ts, width):
+    return -(-ts // width) * width
+
+
+def summarize(port_code, lane, start_ts=None, end_ts=None, path=None):
+    # Covers whole days with 1d rollups and the ragged edges with 1h rollups, so
+    # the cost is O(days + 48) rows whatever the raw history length. Edges are
+    # widened to whole hours, the finest granularity this needs.
+    hour = RESOLUTIONS["1h"]
+    day = RESOLUTIONS["1d"]
+    lo = None if start_ts is None else start_ts - start_ts % hour
+    hi = None if end_ts is None else _ceil_to(end_ts, hour)
+    day_lo = None if lo is None else _ceil_to(lo, day)
+    day_hi = None if hi is None else hi - hi % day
+
+    if day_lo is not None and day_hi is not None and day_lo >= day_hi:
+        ranges = [("1h", lo, hi)]
+    else:
+        ranges = [("1d", day_lo, day_hi)]
+        if lo is not None and lo < day_lo:
+            ranges.append(("1h", lo, day_lo))
+        if hi is not None and day_hi < hi:
+            ranges.append(("1h", day_hi, hi))
+
+    conn = connect(path)
+    count = total = sum_sq = 0
+    low = high = None
+    for resolution, range_lo, range_hi in ranges:
+        sql = (
+            "SELECT SUM(count), SUM(sum), MIN(min), MAX(max), SUM(sum_sq) FROM wait_rollups "
+            "WHERE port_code = ? AND lane = ? AND resolution = ?"
+        )
+        params = [port_code, lane, resolution]
+        if range_lo is not None:
+            sql += " AND bucket_ts >= ?"
+            params.append(range_lo)
+        if range_hi is not None:
+            sql += " AND bucket_ts < ?"
+            params.append(range_hi)
+        n, s, mn, mx, sq = conn.execute(sql, params).fetchone()
+        if not n:
+            continue
+        count += n
+        total += s
+        sum_sq += sq
+        low = mn if low is None else min(low, mn)
+        high = mx if high is None else max(high, mx)
+
+    return {
+        "count": count,
+        "min": low,
+        "max": high,
+        "avg": round(total / count, 2) if count else None,
+        "stddev": _stddev(count, total, sum_sq),
+    }
+
+
+def parse_bound(value):
+    # Accepts epoch seconds or an ISO date/datetime. Naive values are read in the
+    # same port-local wall clock that parse_ts stores.
+    if value is None or value == "":
+        return None
+    if value.lstrip("-").isdigit():
+        return int(value)
+    stamp = datetime.fromisoformat(value)
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return int(stamp.timestamp())
+
+
+def load_sketches(scope, bucket, path=None):
+    # {(port_code, lane): KLLSketch} for one bucket across every port.
+    conn = connect(path)
+    rows = conn.execute(
+        "SELECT port_code, lane, sketch FROM wait_sketches WHERE scope = ? AND bucket = ?",
+        (scope, bucket),
+    )
+    return {(port_code, lane): KLLSketch.from_bytes(blob) for port_code, lane, blob in rows}
+
+
+def merged_sketch(port_code, lane, start_ts=None, end_ts=None, path=None):
+    # Same shape as summarize(): whole months from month sketches, ragged edges
+    # from day sketches, so at most ~62 sketches are merged for any range. Edges
+    # are widened to whole days.
+    day = RESOLUTIONS["1d"]
+    lo = None if start_ts is None else start_ts - start_ts % day
+    hi = None if end_ts is None else _ceil_to(end_ts, day)
+    month_lo = None if lo is None else _month_ceil(lo)
+    month_hi = None if hi is None else month_start(hi)
+
+    if month_lo is not None and month_hi is not None and month_lo >= month_hi:
+        ranges = [("day", lo, hi)]
+    else:
+        ranges = [("month", month_lo, month_hi)]
+        if lo is not None and lo < month_lo:
+            ranges.append(("day", lo, month_lo))
+        if hi is not None and month_hi < hi:
+            ranges.append(("day", month_hi, hi))
+
+    conn = connect(path)
+    merged = KLLSketch()
+    for scope, range_lo, range_hi in ranges:
+        sql = "SELECT sketch FROM wait_sketches WHERE port_code = ? AND lane = ? AND scope = ?"
+        params = [port_code, lane, scope]
+        if range_lo is not None:
+            sql += " AND bucket >= ?"
+            params.append(range_lo)
+        if range_hi is not None:
+            sql += " AND bucket < ?"
+            params.append(range_hi)
+        for (blob,) in conn.execute(sql, params):
+            merged.merge(KLLSketch.from_bytes(blob))
+    return merged
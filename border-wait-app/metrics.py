@@ -0,0 +1,91 @@
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+# Prometheus metrics for the fetch/parse/normalize/store pipeline. Label
+# values are bound once here so the hot path only does `with X.time():` or
+# `.inc()` on a prebuilt child -- no label lookups per observation.
+#
+# With several uvicorn workers each process counts on its own, and a scrape
+# would only see the worker that answered it. start.sh then points
+# PROMETHEUS_MULTIPROC_DIR at an emptied directory before the workers start;
+# prometheus_client keeps every worker's samples in files there and render()
+# merges them. Counters and histograms are summed across workers, past ones
+# included; gauges report the most recently set value of a live worker.
+
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = Histogram(
+    "bwt_stage_seconds",
+    "Time spent in each pipeline stage.",
+    ["pipeline", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+SNAPSHOT_FETCH = STAGE_SECONDS.labels("snapshot", "fetch")
+SNAPSHOT_PARSE = STAGE_SECONDS.labels("snapshot", "parse")
+SNAPSHOT_NORMALIZE = STAGE_SECONDS.labels("snapshot", "normalize")
+# parse and normalize together, when they run in the parallel_feed pool.
+SNAPSHOT_PARSE_PARALLEL = STAGE_SECONDS.labels("snapshot", "parse_normalize_parallel")
+SNAPSHOT_BASELINE = STAGE_SECONDS.labels("snapshot", "baseline")
+SNAPSHOT_FORECAST = STAGE_SECONDS.labels("snapshot", "forecast")
+SNAPSHOT_SCHEMA = STAGE_SECONDS.labels("snapshot", "schema_drift")
+RECORD_FETCH = STAGE_SECONDS.labels("record", "fetch")
+RECORD_PARSE = STAGE_SECONDS.labels("record", "parse")
+RECORD_NORMALIZE = STAGE_SECONDS.labels("record", "normalize")
+RECORD_PARSE_PARALLEL = STAGE_SECONDS.labels("record", "parse_normalize_parallel")
+RECORD_LOCAL_STORE = STAGE_SECONDS.labels("record", "local_store")
+RECORD_REMOTE_STORE = STAGE_SECONDS.labels("record", "remote_store")
+
+RECORD_ROWS = Counter("bwt_record_rows_total", "Rows seen by /record-wait-times.", ["outcome"])
+RECORD_INSERTED = RECORD_ROWS.labels("inserted")
+RECORD_SKIPPED = RECORD_ROWS.labels("skipped")
+RECORD_LOCAL_INSERTED = RECORD_ROWS.labels("local_inserted")
+
+ERRORS = Counter("bwt_errors_total", "Requests that ended in an error response.", ["endpoint"])
+WAIT_TIMES_ERRORS = ERRORS.labels("wait_times")
+RECORD_ERRORS = ERRORS.labels("record_wait_times")
+
+SNAPSHOT_LOOKUPS = Counter(
+    "bwt_snapshot_lookups_total",
+    "Snapshot cache lookups: hit (served within TTL), unchanged (refetched, same body), rebuilt, "
+    "stale (expired snapshot served while a refresh was in flight or after it failed), "
+    "adopted (loaded the snapshot another worker published).",
+    ["result"],
+)
+SNAPSHOT_HIT = SNAPSHOT_LOOKUPS.labels("hit")
+SNAPSHOT_UNCHANGED = SNAPSHOT_LOOKUPS.labels("unchanged")
+SNAPSHOT_REBUILT = SNAPSHOT_LOOKUPS.labels("rebuilt")
+SNAPSHOT_STALE = SNAPSHOT_LOOKUPS.labels("stale")
+SNAPSHOT_ADOPTED = SNAPSHOT_LOOKUPS.labels("adopted")
+
+SNAPSHOT_AGE = Gauge(
+    "bwt_snapshot_age_seconds", "Seconds since the served snapshot last changed.",
+    multiprocess_mode="livemostrecent",
+)
+SNAPSHOT_PORTS = Gauge("bwt_snapshot_ports", "Ports in the served snapshot.", multiprocess_mode="livemostrecent")
+
+SCHEMA_OBSERVED = Gauge(
+    "bwt_schema_observed_paths", "Distinct element paths in the latest CBP feed.",
+    multiprocess_mode="livemostrecent",
+)
+SCHEMA_CHANGES = Counter("bwt_schema_changes_total", "Feed element paths that appeared or vanished.", ["change"])
+SCHEMA_APPEARED = SCHEMA_CHANGES.labels("appeared")
+SCHEMA_VANISHED = SCHEMA_CHANGES.labels("vanished")
+
+
+def render():
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def shutdown():
+    # Drops this worker's live gauges from the merged view.
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
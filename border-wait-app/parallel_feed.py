@@ -0,0 +1,139 @@
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import xmltodict
+
+# Parses and normalizes large feed bodies (the 10k-port fixtures, multi-source
+# feeds, archived bwt.xml files) across a process pool. The body is cut into
+# byte ranges that end on a </port> boundary, so no element is split; each
+# worker parses its range wrapped in a <border_wait_time> root and normalizes
+# the ports it got, and the results are concatenated in order. Everything
+# outside the port elements (last_updated_date, number_of_ports, ...) is
+# parsed once in the caller.
+#
+# Workers come from a forkserver that has already imported border_app, so
+# starting one is a fork rather than a fresh interpreter, and the caller can
+# be a threaded server. PARSE_WORKERS <= 1 keeps everything in-process.
+
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+# Below this the pool costs more (pickling results back) than it saves.
+PARALLEL_PARSE_MIN_BYTES = int(os.getenv("PARALLEL_PARSE_MIN_BYTES", str(2 * 1024 * 1024)))
+# Ranges per worker, so one slow range doesn't leave the others idle.
+CHUNKS_PER_WORKER = 4
+
+_PORT_START = re.compile(rb"<port[\s>/]")
+_PORT_END = b"</port>"
+_DECLARATION = re.compile(rb"\s*<\?xml[^>]*\?>")
+_ROOT = "border_wait_time"
+
+_pool = {"executor": None, "workers": 0}
+_pool_lock = threading.Lock()
+
+
+def enabled(content, workers=None):
+    workers = PARSE_WORKERS if workers is None else workers
+    return workers > 1 and len(content) >= PARALLEL_PARSE_MIN_BYTES
+
+
+def split(content, n_chunks):
+    # (declaration, outside, chunks): the XML declaration to repeat on every
+    # chunk, the body with the port elements cut out, and up to n_chunks byte
+    # strings of whole <port> elements.
+    declaration = _DECLARATION.match(content)
+    declaration = declaration.group().strip() if declaration else b""
+    first = _PORT_START.search(content)
+    last = content.rfind(_PORT_END)
+    if first is None or last < first.start():
+        return declaration, content, []
+    start, end = first.start(), last + len(_PORT_END)
+
+    chunks, target = [], max(1, (end - start) // max(1, n_chunks))
+    offset = start
+    while offset < end:
+        cut = content.find(_PORT_END, min(offset + target, end - len(_PORT_END)))
+        cut = end if cut < 0 else cut + len(_PORT_END)
+        chunks.append(content[offset:cut])
+        offset = cut
+    return declaration, content[:start] + content[end:], chunks
+
+
+def _ports(data):
+    ports = (data.get(_ROOT) or {}).get("port") or []
+    return [ports] if isinstance(ports, dict) else ports
+
+
+def _parse_chunk(declaration, chunk):
+    return _ports(xmltodict.parse(declaration + f"<{_ROOT}>".encode() + chunk + f"</{_ROOT}>".encode()))
+
+
+def _normalize_chunk(declaration, chunk):
+    import border_app
+
+    diagnostics = {"missing_lanes": {}}
+    items = [border_app.normalize_port(port, diagnostics) for port in _parse_chunk(declaration, chunk)]
+    return items, diagnostics
+
+
+def _history_rows_chunk(declaration, chunk):
+    import border_app
+
+    stale_ports = []
+    rows = [border_app.build_history_row(port, stale_ports) for port in _parse_chunk(declaration, chunk)]
+    return rows, stale_ports
+
+
+def executor(workers=None):
+    workers = PARSE_WORKERS if workers is None else workers
+    with _pool_lock:
+        if _pool["executor"] is None or _pool["workers"] != workers:
+            if _pool["executor"] is not None:
+                _pool["executor"].shutdown()
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["border_app"])
+            _pool["executor"] = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pool["workers"] = workers
+        return _pool["executor"]
+
+
+def shutdown():
+    with _pool_lock:
+        if _pool["executor"] is not None:
+            _pool["executor"].shutdown()
+        _pool["executor"], _pool["workers"] = None, 0
+
+
+def _map(fn, content, workers):
+    declaration, outside, chunks = split(content, workers * CHUNKS_PER_WORKER)
+    results = executor(workers).map(fn, [declaration] * len(chunks), chunks)
+    return xmltodict.parse(outside), list(results)
+
+
+def normalize(content, workers=None):
+    # (data, summary, diagnostics), as build_snapshot computes them in one
+    # process. data is the parsed feed rebuilt from each item's full_xml.
+    workers = PARSE_WORKERS if workers is None else workers
+    data, results = _map(_normalize_chunk, content, workers)
+    summary, diagnostics = [], {"missing_lanes": {}}
+    for items, chunk_diagnostics in results:
+        summary.extend(items)
+        for lane, names in chunk_diagnostics["missing_lanes"].items():
+            diagnostics["missing_lanes"].setdefault(lane, []).extend(names)
+    root = data.get(_ROOT) or {}
+    if summary:
+        root["port"] = [item["full_xml"] for item in summary]
+    data[_ROOT] = root
+    return data, summary, diagnostics
+
+
+def history_rows(content, workers=None):
+    # (rows, stale_ports), as build_history_row gives them for every port.
+    workers = PARSE_WORKERS if workers is None else workers
+    _data, results = _map(_history_rows_chunk, content, workers)
+    rows, stale_ports = [], []
+    for chunk_rows, chunk_stale in results:
+        rows.extend(chunk_rows)
+        stale_ports.extend(chunk_stale)
+    return rows, stale_ports
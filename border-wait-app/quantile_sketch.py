@@ -0,0 +1,124 @@
+import random
+import struct
+
+# KLL quantile sketch (Karnin, Lang, Liberty 2016) for integer delay minutes.
+# Memory is bounded by roughly 3*k items whatever the number of readings, two
+# sketches merge into one with the same error bound, and the serialized form is
+# a few hundred bytes, which is what lets us keep one per port/lane/bucket.
+
+SKETCH_K = 100
+_C = 2.0 / 3.0
+_VERSION = 1
+_HEADER = struct.Struct("<BHIB")
+_LEVEL_LEN = struct.Struct("<H")
+_MAX_ITEM = 0xFFFF
+
+
+class KLLSketch:
+    def __init__(self, k=SKETCH_K):
+        self.k = k
+        self.n = 0
+        self.levels = [[]]
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return 2 * int(self.k * _C ** depth + 0.999) + 1
+
+    def _max_size(self):
+        return sum(self._capacity(h) for h in range(len(self.levels)))
+
+    def _size(self):
+        return sum(len(level) for level in self.levels)
+
+    def _compress(self):
+        while self._size() >= self._max_size():
+            for h in range(len(self.levels)):
+                if len(self.levels[h]) >= self._capacity(h):
+                    if h + 1 == len(self.levels):
+                        self.levels.append([])
+                    items = sorted(self.levels[h])
+                    # An odd leftover stays behind so total weight is preserved.
+                    leftover = [items.pop()] if len(items) % 2 else []
+                    offset = random.getrandbits(1)
+                    self.levels[h + 1].extend(items[offset::2])
+                    self.levels[h] = leftover
+                    break
+            else:
+                return
+
+    def update(self, value):
+        self.levels[0].append(min(max(int(value), 0), _MAX_ITEM))
+        self.n += 1
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for h, level in enumerate(other.levels):
+            self.levels[h].extend(level)
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _weighted(self):
+        pairs = []
+        for h, level in enumerate(self.levels):
+            weight = 1 << h
+            pairs.extend((item, weight) for item in level)
+        pairs.sort()
+        return pairs
+
+    def quantile(self, q):
+        pairs = self._weighted()
+        if not pairs:
+            return None
+        total = sum(weight for _, weight in pairs)
+        target = q * total
+        seen = 0
+        for item, weight in pairs:
+            seen += weight
+            if seen >= target:
+                return item
+        return pairs[-1][0]
+
+    def quantiles(self, qs):
+        return {q: self.quantile(q) for q in qs}
+
+    def rank(self, value):
+        # Percent of readings below value, ties counted as half.
+        total = below = equal = 0
+        for h, level in enumerate(self.levels):
+            weight = 1 << h
+            for item in level:
+                total += weight
+                if item < value:
+                    below += weight
+                elif item == value:
+                    equal += weight
+        if not total:
+            return None
+        return round(100.0 * (below + 0.5 * equal) / total, 1)
+
+    def to_bytes(self):
+        parts = [_HEADER.pack(_VERSION, self.k, self.n, len(self.levels))]
+        for level in self.levels:
+            parts.append(_LEVEL_LEN.pack(len(level)))
+            parts.append(struct.pack(f"<{len(level)}H", *level))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        version, k, n, num_levels = _HEADER.unpack_from(data, 0)
+        if version != _VERSION:
+            raise ValueError(f"Unsupported sketch version {version}")
+        sketch = cls(k)
+        sketch.n = n
+        sketch.levels = []
+        offset = _HEADER.size
+        for _ in range(num_levels):
+            (length,) = _LEVEL_LEN.unpack_from(data, offset)
+            offset += _LEVEL_LEN.size
+            sketch.levels.append(list(struct.unpack_from(f"<{length}H", data, offset)))
+            offset += 2 * length
+        return sketch
@@ -0,0 +1,44 @@
+import os
+
+import baseline
+import forecast
+import spatial_index
+
+# Ranks crossings by estimated door-to-booth time: a rough drive time from
+# straight-line distance plus the expected wait when the traveler gets there.
+# Everything comes from the in-memory snapshot, forecasts and spatial index.
+
+AVG_SPEED_KMH = float(os.getenv("RECOMMEND_AVG_SPEED_KMH", "60"))
+# Roads are longer than the straight line; ~1.3 is a common detour factor.
+ROAD_FACTOR = float(os.getenv("RECOMMEND_ROAD_FACTOR", "1.3"))
+CANDIDATES = 10
+
+
+def drive_minutes(distance_km):
+    return distance_km * ROAD_FACTOR / AVG_SPEED_KMH * 60
+
+
+def rank(lat, lon, lane, by_code, k=CANDIDATES, max_km=spatial_index.NEARBY_MAX_KM):
+    ranked = []
+    unknown = []
+    for port_code, distance_km in spatial_index.nearest(lat, lon, k, max_km):
+        info = spatial_index.registry()[port_code]
+        item = by_code.get(port_code)
+        current = baseline.lane_delay(item, lane) if item else None
+        drive = drive_minutes(distance_km)
+        predicted = forecast.delay_at(port_code, lane, drive, current)
+        wait = predicted if predicted is not None else current
+        entry = {
+            "port_code": port_code,
+            "crossing_name": info["crossing_name"],
+            "port_name": info["port_name"],
+            "distance_km": distance_km,
+            "drive_minutes": round(drive, 1),
+            "current_delay_minutes": current,
+            "expected_delay_minutes": wait,
+            "wait_source": "forecast" if predicted is not None else ("current" if current is not None else None),
+            "total_minutes": None if wait is None else round(drive + wait, 1),
+        }
+        (unknown if wait is None else ranked).append(entry)
+    ranked.sort(key=lambda entry: entry["total_minutes"])
+    return ranked + unknown
@@ -0,0 +1,108 @@
+import time
+
+import applog
+import history_store
+import metrics
+
+# Tracks which element paths the CBP feed contains, once per new snapshot, so
+# fields CBP adds or drops show up in /schema-drift and in metrics instead of
+# a print per port per request.
+
+# Port-level keys normalize_port() reads; anything else is carried only in full_xml.
+PARSED_PORT_KEYS = {
+    "crossing_name", "port_name", "port_code", "state", "region", "hours", "border",
+    "date", "time", "construction_notice", "note", "port_status",
+    "passenger_vehicle_lanes", "commercial_vehicle_lanes", "pedestrian_lanes",
+}
+# Appeared paths are reported for this long after they were first seen.
+APPEARED_WINDOW_SECONDS = 7 * 24 * 3600
+
+logger = applog.get_logger("schema_drift")
+_report = {"checked_at": None, "observed": 0, "unparsed_port_keys": []}
+
+
+def _walk(node, prefix, paths):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            path = f"{prefix}.{key}"
+            paths.add(path)
+            _walk(value, path, paths)
+    elif isinstance(node, list):
+        for value in node:
+            _walk(value, prefix, paths)
+
+
+def collect_paths(data):
+    paths = set()
+    _walk(data, "", paths)
+    return {path.lstrip(".") for path in paths}
+
+
+def check(data, now=None):
+    # data is the xmltodict-parsed feed. Records every path seen, logs and
+    # counts paths that are new or missing compared to the previous snapshot.
+    now = int(now if now is not None else time.time())
+    paths = collect_paths(data)
+    conn = history_store.connect()
+    with conn:
+        previous_check = conn.execute("SELECT MAX(last_seen) FROM schema_paths").fetchone()[0]
+        known = {path for (path,) in conn.execute("SELECT path FROM schema_paths")}
+        previous = {
+            path for (path,) in conn.execute(
+                "SELECT path FROM schema_paths WHERE last_seen = ?", (previous_check,)
+            )
+        }
+        conn.executemany(
+            "INSERT INTO schema_paths (path, first_seen, last_seen) VALUES (?, ?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET last_seen = excluded.last_seen",
+            [(path, now, now) for path in paths],
+        )
+
+    appeared = sorted(paths - known) if known else []
+    vanished = sorted(previous - paths)
+    if appeared:
+        metrics.SCHEMA_APPEARED.inc(len(appeared))
+    if vanished:
+        metrics.SCHEMA_VANISHED.inc(len(vanished))
+    if appeared or vanished:
+        logger.warning("feed schema changed", extra=applog.fields(appeared=appeared, vanished=vanished))
+
+    ports = (data.get("border_wait_time") or {}).get("port") or []
+    if isinstance(ports, dict):
+        ports = [ports]
+    unparsed = set()
+    for port in ports:
+        unparsed.update(set(port.keys()) - PARSED_PORT_KEYS)
+
+    metrics.SCHEMA_OBSERVED.set(len(paths))
+    _report.update(checked_at=now, observed=len(paths), unparsed_port_keys=sorted(unparsed))
+
+
+def report(now=None):
+    now = int(now if now is not None else time.time())
+    conn = history_store.connect()
+    bounds = conn.execute("SELECT MIN(first_seen), MAX(last_seen) FROM schema_paths").fetchone()
+    baseline_ts, latest = bounds
+    appeared = [
+        {"path": path, "first_seen": first_seen}
+        for path, first_seen in conn.execute(
+            "SELECT path, first_seen FROM schema_paths WHERE first_seen > ? AND first_seen >= ? "
+            "ORDER BY first_seen DESC, path",
+            (baseline_ts or 0, now - APPEARED_WINDOW_SECONDS),
+        )
+    ]
+    vanished = [
+        {"path": path, "last_seen": last_seen}
+        for path, last_seen in conn.execute(
+            "SELECT path, last_seen FROM schema_paths WHERE last_seen < ? ORDER BY last_seen DESC, path",
+            (latest or 0,),
+        )
+    ]
+    return {
+        "checked_at": _report["checked_at"],
+        "observed_paths": _report["observed"],
+        "tracking_since": baseline_ts,
+        "appeared": appeared,
+        "vanished": vanished,
+        "unparsed_port_keys": _report["unparsed_port_keys"],
+    }
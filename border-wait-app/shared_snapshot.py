@@ -0,0 +1,79 @@
+import fcntl
+import mmap
+import os
+import struct
+
+# Coordination for several uvicorn workers (WEB_CONCURRENCY > 1) serving one
+# snapshot. The snapshot itself is the snapshot_file written to
+# SNAPSHOT_CACHE_PATH, which every worker maps read-only, so the page cache
+# holds one copy. Next to it:
+#
+#   <path>.ctl   a small mmap'd control block -- magic, format version,
+#                generation, checked_at (wall clock of the last CBP check by
+#                any worker) and the digest of the published snapshot
+#   <path>.lock  flock'd by the one worker refreshing from CBP
+#
+# The lock holder is the only writer of the control block. It bumps the
+# generation to an odd value, writes the fields, then bumps it to even again;
+# readers retry while it is odd or changed underneath them (a seqlock), so
+# nobody takes a lock just to read.
+
+MAGIC = b"BWTC"
+VERSION = 1
+_CONTROL = struct.Struct("<4sHHQd20s")
+_GENERATION = struct.Struct("<Q")
+_GENERATION_OFFSET = 8
+# Reads give up after this many torn attempts (a writer that died mid-publish)
+# and report nothing published; the next publish repairs the block.
+_READ_ATTEMPTS = 1000
+
+
+class SharedSnapshot:
+    def __init__(self, path):
+        self.path = path
+        self._lock_fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        fd = os.open(f"{path}.ctl", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_size < _CONTROL.size:
+                os.ftruncate(fd, _CONTROL.size)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            self._control = mmap.mmap(fd, _CONTROL.size)
+        finally:
+            os.close(fd)
+
+    def read(self):
+        # (generation, checked_at, digest) as last published; digest is None
+        # until a worker has published once.
+        for _ in range(_READ_ATTEMPTS):
+            magic, version, _flags, generation, checked_at, digest = _CONTROL.unpack_from(self._control, 0)
+            if generation % 2:
+                continue
+            if _GENERATION.unpack_from(self._control, _GENERATION_OFFSET)[0] != generation:
+                continue
+            if magic != MAGIC or version != VERSION:
+                break
+            return generation, checked_at, digest.hex()
+        return 0, 0.0, None
+
+    def acquire(self, block=False):
+        # True when this process is now the refresher.
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX if block else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def release(self):
+        fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def publish(self, digest, checked_at):
+        # Only call while holding acquire(). The snapshot file for digest must
+        # already be in place.
+        (generation,) = _GENERATION.unpack_from(self._control, _GENERATION_OFFSET)
+        generation += generation % 2
+        _GENERATION.pack_into(self._control, _GENERATION_OFFSET, generation + 1)
+        self._control[:_CONTROL.size] = _CONTROL.pack(
+            MAGIC, VERSION, 0, generation + 1, checked_at, bytes.fromhex(digest),
+        )
+        _GENERATION.pack_into(self._control, _GENERATION_OFFSET, generation + 2)
@@ -0,0 +1,200 @@
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+# Binary form of a built /wait-times snapshot, so a restarted process can
+# serve without re-fetching, re-parsing or re-running the baseline lookups.
+#
+# Layout (little-endian), every section at a fixed offset from the header:
+#   header   magic, version, flags, item count, path count, created_at, feed digest,
+#            and the byte length of each section below
+#   paths    JSON list of leaf key paths, e.g. ["passenger_vehicle_lanes",
+#            "standard_lanes", "delay_minutes"], in first-seen order
+#   values   deduplicated leaf values: a tag byte plus payload each
+#   cells    uint32 (items, paths) matrix of 1-based value ids, 0 = key absent,
+#            4-byte aligned
+#   extra    JSON list of each item's full_xml, which the cells only mark
+#
+# Items share one shape and most leaves repeat ("Open", None, lane update
+# times), so the value table stays small. The cell matrix is read in place
+# with np.frombuffer, from a file mmap or any other buffer.
+
+MAGIC = b"BWTS"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHIId20sIIII")
+_TAG_NONE, _TAG_TRUE, _TAG_FALSE, _TAG_EMPTY = b"n", b"t", b"f", b"e"
+_TAG_INT, _TAG_FLOAT, _TAG_STR, _TAG_JSON = b"i", b"d", b"s", b"j"
+_TAG_EXTRA = b"x"
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_LEN = struct.Struct("<I")
+# Kept out of the value table: nested and different for every port.
+EXTRA_KEY = "full_xml"
+_EXTRA = object()
+
+
+def _leaves(item, prefix=()):
+    for key, value in item.items():
+        path = prefix + (key,)
+        if prefix == () and key == EXTRA_KEY:
+            yield path, _EXTRA
+        elif isinstance(value, dict) and value:
+            yield from _leaves(value, path)
+        else:
+            yield path, value
+
+
+def _encode_value(value):
+    if value is _EXTRA:
+        return _TAG_EXTRA
+    if value is None:
+        return _TAG_NONE
+    if value is True:
+        return _TAG_TRUE
+    if value is False:
+        return _TAG_FALSE
+    if isinstance(value, dict):
+        return _TAG_EMPTY
+    if isinstance(value, int) and -(2 ** 63) <= value < 2 ** 63:
+        return _TAG_INT + _INT.pack(value)
+    if isinstance(value, float):
+        return _TAG_FLOAT + _FLOAT.pack(value)
+    if isinstance(value, str):
+        data = value.encode()
+        return _TAG_STR + _LEN.pack(len(data)) + data
+    data = json.dumps(value, separators=(",", ":")).encode()
+    return _TAG_JSON + _LEN.pack(len(data)) + data
+
+
+def _decode_values(buffer):
+    values, offset, end = [], 0, len(buffer)
+    while offset < end:
+        tag = bytes(buffer[offset:offset + 1])
+        offset += 1
+        if tag == _TAG_EXTRA:
+            values.append(_EXTRA)
+        elif tag == _TAG_NONE:
+            values.append(None)
+        elif tag == _TAG_TRUE:
+            values.append(True)
+        elif tag == _TAG_FALSE:
+            values.append(False)
+        elif tag == _TAG_EMPTY:
+            values.append({})
+        elif tag == _TAG_INT:
+            values.append(_INT.unpack_from(buffer, offset)[0])
+            offset += _INT.size
+        elif tag == _TAG_FLOAT:
+            values.append(_FLOAT.unpack_from(buffer, offset)[0])
+            offset += _FLOAT.size
+        else:
+            (length,) = _LEN.unpack_from(buffer, offset)
+            offset += _LEN.size
+            text = bytes(buffer[offset:offset + length]).decode()
+            offset += length
+            values.append(text if tag == _TAG_STR else json.loads(text))
+    return values
+
+
+def _padding(size):
+    # Bytes after the header, paths and values so the cells start aligned.
+    return -(_HEADER.size + size) % 4
+
+
+def encode(payload, digest=None, created_at=None):
+    items = payload["all_ports_summary"]
+    path_index, value_index, value_parts = {}, {}, []
+    rows = []
+    for item in items:
+        row = {}
+        for path, value in _leaves(item):
+            column = path_index.setdefault(path, len(path_index))
+            encoded = _encode_value(value)
+            value_id = value_index.get(encoded)
+            if value_id is None:
+                value_parts.append(encoded)
+                value_id = value_index[encoded] = len(value_parts)
+            row[column] = value_id
+        rows.append(row)
+
+    cells = np.zeros((len(items), len(path_index)), dtype="<u4")
+    for i, row in enumerate(rows):
+        if row:
+            cells[i, list(row)] = list(row.values())
+
+    paths = json.dumps([list(path) for path in path_index], separators=(",", ":")).encode()
+    values = b"".join(value_parts)
+    padding = b"\0" * _padding(len(paths) + len(values))
+    extra = json.dumps([item.get(EXTRA_KEY) for item in items], separators=(",", ":")).encode()
+    header = _HEADER.pack(
+        MAGIC, VERSION, 0, len(items), len(path_index),
+        time.time() if created_at is None else created_at,
+        bytes.fromhex(digest) if digest else b"\0" * 20,
+        len(paths), len(values), cells.nbytes, len(extra),
+    )
+    return b"".join((header, paths, values, padding, cells.tobytes(), extra))
+
+
+def read_header(buffer):
+    magic, version, _flags, n_items, n_paths, created_at, digest, *lengths = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a snapshot file")
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    return {
+        "items": n_items,
+        "paths": n_paths,
+        "created_at": created_at,
+        "digest": digest.hex() if any(digest) else None,
+        "lengths": lengths,
+    }
+
+
+def decode(buffer):
+    # Returns (payload, digest, created_at). buffer: bytes, mmap or memoryview.
+    header = read_header(buffer)
+    view = memoryview(buffer)
+    paths_len, values_len, cells_len, extra_len = header["lengths"]
+    offset = _HEADER.size
+    paths = [tuple(path) for path in json.loads(bytes(view[offset:offset + paths_len]))]
+    offset += paths_len
+    values = [None] + _decode_values(view[offset:offset + values_len])
+    offset += values_len + _padding(paths_len + values_len)
+    cells = np.frombuffer(view, dtype="<u4", count=header["items"] * header["paths"], offset=offset)
+    cells = cells.reshape(header["items"], header["paths"]).tolist()
+    offset += cells_len
+    extras = json.loads(bytes(view[offset:offset + extra_len]))
+
+    summary = []
+    for row, extra in zip(cells, extras):
+        item = {}
+        for path, value_id in zip(paths, row):
+            if not value_id:
+                continue
+            node = item
+            for key in path[:-1]:
+                node = node.setdefault(key, {})
+            value = values[value_id]
+            node[path[-1]] = extra if value is _EXTRA else value
+        summary.append(item)
+    payload = {"ports_found": len(summary), "all_ports_summary": summary}
+    return payload, header["digest"], header["created_at"]
+
+
+def save(path, payload, digest=None):
+    # Temp file plus rename, so readers never see half a snapshot. The temp
+    # name is per process because several workers may save at once.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(encode(payload, digest))
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return decode(mapped)
@@ -0,0 +1,108 @@
+import heapq
+import json
+import math
+import os
+
+# Static crossing coordinates keyed by CBP port_code, plus a k-d tree over
+# them. Points live on the unit sphere as (x, y, z) so straight-line distance
+# orders the same way as great-circle distance and there is no dateline or
+# pole special-casing.
+
+PORT_COORDS_PATH = os.getenv(
+    "PORT_COORDS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "port_coords.json")
+)
+EARTH_RADIUS_KM = 6371.0
+# Crossings farther than this are not "nearby"; /nearby and /recommend return
+# fewer results (or none) rather than padding with distant ports.
+NEARBY_MAX_KM = float(os.getenv("NEARBY_MAX_KM", "300"))
+
+
+def load_registry(path=PORT_COORDS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def to_xyz(lat, lon):
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    d_lat = math.radians(lat2 - lat1)
+    d_lon = math.radians(lon2 - lon1)
+    a = (math.sin(d_lat / 2) ** 2
+         + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lon / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class KDTree:
+    def __init__(self, points):
+        # points: [(key, (x, y, z)), ...]
+        points = list(points)
+        self.size = len(points)
+        self.root = self._build(points, 0)
+
+    def _build(self, points, depth):
+        if not points:
+            return None
+        axis = depth % 3
+        points.sort(key=lambda p: p[1][axis])
+        mid = len(points) // 2
+        return (
+            points[mid],
+            axis,
+            self._build(points[:mid], depth + 1),
+            self._build(points[mid + 1:], depth + 1),
+        )
+
+    def nearest(self, xyz, k):
+        # Returns [(squared chord distance, key), ...] closest first.
+        best = []  # max-heap via negated distances
+
+        def visit(node):
+            if node is None:
+                return
+            (key, point), axis, left, right = node
+            dist = sum((a - b) ** 2 for a, b in zip(point, xyz))
+            if len(best) < k:
+                heapq.heappush(best, (-dist, key))
+            elif dist < -best[0][0]:
+                heapq.heapreplace(best, (-dist, key))
+            diff = xyz[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if len(best) < k or diff * diff < -best[0][0]:
+                visit(far)
+
+        visit(self.root)
+        return sorted((-d, key) for d, key in best)
+
+
+_registry = load_registry()
+_tree = KDTree((code, to_xyz(info["lat"], info["lon"])) for code, info in _registry.items())
+
+
+def registry():
+    return _registry
+
+
+def nearest(lat, lon, k, max_km=NEARBY_MAX_KM):
+    # [(port_code, distance_km), ...] for the k closest registered crossings
+    # within max_km.
+    results = []
+    for _, code in _tree.nearest(to_xyz(lat, lon), k):
+        info = _registry[code]
+        distance_km = haversine_km(lat, lon, info["lat"], info["lon"])
+        if distance_km <= max_km:
+            results.append((code, round(distance_km, 2)))
+    return results
+
+
+def unlocated(by_code):
+    # Snapshot ports with no coordinates in the registry, which distance
+    # queries can't place: [{"port_code", "crossing_name", "port_name"}, ...].
+    return [
+        {"port_code": code, "crossing_name": item.get("crossing_name"), "port_name": item.get("port_name")}
+        for code, item in sorted(by_code.items())
+        if code not in _registry
+    ]
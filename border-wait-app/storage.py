@@ -0,0 +1,242 @@
+import itertools
+import os
+import sqlite3
+import threading
+
+import history_store
+
+# Where /record-wait-times writes border_wait_history rows. Supabase is the
+# production backend; MemoryStorage and SQLiteStorage reproduce its table
+# semantics -- rows keyed by (port_code, date, time), insert rejects a key
+# that exists, upsert replaces -- so recording and dedup can run and be
+# benchmarked without network access.
+#
+# HISTORY_STORAGE picks the backend: "supabase" (default when SUPABASE_URL and
+# SUPABASE_KEY are set), "sqlite" (HISTORY_STORAGE_PATH) or "memory".
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+HISTORY_STORAGE = os.getenv("HISTORY_STORAGE")
+HISTORY_STORAGE_PATH = os.getenv("HISTORY_STORAGE_PATH", "border_wait_history_remote.db")
+TABLE = "border_wait_history"
+KEY = ("port_code", "date", "time")
+# Rows per request for batched calls; keeps PostgREST URLs and bodies bounded.
+BATCH_SIZE = 500
+# Rows per page of a Supabase select. Must not exceed the project's API max
+# rows setting (1000 by default), or a capped page looks like the last one.
+SUPABASE_PAGE_ROWS = int(os.getenv("SUPABASE_PAGE_ROWS", "1000"))
+# Keys per SQLite lookup: three bound variables each, under the 999-variable
+# limit of older SQLite builds.
+SQLITE_KEY_BATCH = 300
+
+
+class DuplicateRowError(Exception):
+    pass
+
+
+def row_key(row):
+    return tuple(row.get(field) for field in KEY)
+
+
+def _chunks(items, size=BATCH_SIZE):
+    items = iter(items)
+    while chunk := list(itertools.islice(items, size)):
+        yield chunk
+
+
+class HistoryStorage:
+    def exists(self, port_code, date, time):
+        return bool(self.existing_keys([(port_code, date, time)]))
+
+    def existing_keys(self, keys):
+        # The subset of (port_code, date, time) keys already stored.
+        raise NotImplementedError
+
+    def insert(self, row):
+        self.insert_many([row])
+
+    def insert_many(self, rows):
+        raise NotImplementedError
+
+    def upsert(self, rows):
+        raise NotImplementedError
+
+    def insert_new(self, rows):
+        # Batched dedup: one key lookup and one insert per BATCH_SIZE rows
+        # instead of a select and an insert per row. Returns (inserted, skipped).
+        inserted = skipped = 0
+        for chunk in _chunks(rows):
+            existing = self.existing_keys([row_key(row) for row in chunk])
+            fresh, seen = [], set(existing)
+            for row in chunk:
+                key = row_key(row)
+                if key in seen:
+                    skipped += 1
+                    continue
+                seen.add(key)
+                fresh.append(row)
+            if fresh:
+                self.insert_many(fresh)
+            inserted += len(fresh)
+        return inserted, skipped
+
+
+class SupabaseStorage(HistoryStorage):
+    # The supabase package and its client are only loaded on first use, so
+    # processes that never record (read-only /wait-times traffic) skip both.
+
+    def __init__(self, url, key):
+        self.url = url
+        self.key = key
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from supabase import create_client
+
+                    self._client = create_client(self.url, self.key)
+        return self._client
+
+    def exists(self, port_code, date, time):
+        existing = self.client.table(TABLE) \
+            .select("id") \
+            .eq("port_code", port_code) \
+            .eq("date", date) \
+            .eq("time", time) \
+            .execute()
+        return bool(existing.data)
+
+    def existing_keys(self, keys):
+        # PostgREST cannot filter on a tuple, so each field is filtered with
+        # IN and the (small) cross-product superset is paged through by id:
+        # responses are capped at the project's max rows, and a single
+        # truncated page would let duplicates through.
+        found = set()
+        for chunk in _chunks(keys):
+            wanted = set(chunk)
+            query = self.client.table(TABLE).select(",".join(KEY))
+            for i, field in enumerate(KEY):
+                query = query.in_(field, sorted({key[i] for key in wanted if key[i] is not None}))
+            query = query.order("id")
+            offset = 0
+            while True:
+                page = query.range(offset, offset + SUPABASE_PAGE_ROWS - 1).execute().data
+                found.update(key for key in map(row_key, page) if key in wanted)
+                if len(page) < SUPABASE_PAGE_ROWS:
+                    break
+                offset += len(page)
+        return found
+
+    def insert_many(self, rows):
+        for chunk in _chunks(rows):
+            self.client.table(TABLE).insert(chunk).execute()
+
+    def upsert(self, rows):
+        for chunk in _chunks(rows):
+            self.client.table(TABLE).upsert(chunk, on_conflict=",".join(KEY)).execute()
+
+
+class MemoryStorage(HistoryStorage):
+    def __init__(self):
+        self.rows = {}
+        self._ids = itertools.count(1)
+
+    def existing_keys(self, keys):
+        return {key for key in keys if key in self.rows}
+
+    def insert_many(self, rows):
+        keys = [row_key(row) for row in rows]
+        if len(set(keys)) != len(keys) or any(key in self.rows for key in keys):
+            raise DuplicateRowError(f"duplicate key in {TABLE}")
+        for key, row in zip(keys, rows):
+            self.rows[key] = {**row, "id": next(self._ids)}
+
+    def upsert(self, rows):
+        for row in rows:
+            key = row_key(row)
+            current = self.rows.get(key)
+            self.rows[key] = {**row, "id": current["id"] if current else next(self._ids)}
+
+
+class SQLiteStorage(HistoryStorage):
+    # Same table layout as the local history store, in its own file: only
+    # border_wait_history and its (port_code, date, time) key, with none of
+    # the store's indexes, rollups or sketches, so it behaves like the remote
+    # table alone.
+
+    _UPDATE_COLUMNS = [c for c in history_store.COLUMNS if c not in KEY]
+    _INSERT_SQL = (
+        f"INSERT INTO {TABLE} ({', '.join(history_store.COLUMNS)}) "
+        f"VALUES ({', '.join(':' + c for c in history_store.COLUMNS)})"
+    )
+    _UPSERT_SQL = (
+        _INSERT_SQL + f" ON CONFLICT ({', '.join(KEY)}) DO UPDATE SET "
+        + ", ".join(f"{c} = excluded.{c}" for c in _UPDATE_COLUMNS)
+    )
+
+    def __init__(self, path=None):
+        self.path = path or HISTORY_STORAGE_PATH
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self):
+        # One connection per thread, like history_store.connect.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(history_store.HISTORY_TABLE_SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def existing_keys(self, keys):
+        # Exact-key lookups joined against the UNIQUE (port_code, date, time)
+        # index, so the cost follows the number of keys, not the table size.
+        conn = self._connect()
+        found = set()
+        for chunk in _chunks(keys, SQLITE_KEY_BATCH):
+            sql = (
+                f"SELECT h.port_code, h.date, h.time "
+                f"FROM (VALUES {', '.join(['(?, ?, ?)'] * len(chunk))}) AS k "
+                f"JOIN {TABLE} AS h ON h.port_code = k.column1 AND h.date = k.column2 AND h.time = k.column3"
+            )
+            found.update(map(tuple, conn.execute(sql, [field for key in chunk for field in key])))
+        return found
+
+    def insert_many(self, rows):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(self._INSERT_SQL, map(history_store.to_db_row, rows))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateRowError(str(e)) from e
+
+    def upsert(self, rows):
+        conn = self._connect()
+        with conn:
+            conn.executemany(self._UPSERT_SQL, map(history_store.to_db_row, rows))
+
+
+def from_env():
+    # The configured backend, or None when recording is local-only. Cheap:
+    # nothing connects until the first call.
+    has_credentials = bool(SUPABASE_URL and SUPABASE_KEY)
+    kind = HISTORY_STORAGE or ("supabase" if has_credentials else None)
+    if kind == "supabase":
+        return SupabaseStorage(SUPABASE_URL, SUPABASE_KEY) if has_credentials else None
+    if kind == "sqlite":
+        return SQLiteStorage()
+    if kind == "memory":
+        return MemoryStorage()
+    if kind:
+        raise ValueError(f"Unknown HISTORY_STORAGE '{kind}'. Expected supabase, sqlite or memory")
+    return None
@@ -0,0 +1,118 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+
+# A stand-in for the supabase client's PostgREST query builder: in_ / order /
+# range filters over an in-memory table, and every response capped at
+# max_rows like the project's API max rows setting.
+
+
+class FakeQuery:
+    def __init__(self, table, max_rows):
+        self.table = table
+        self.max_rows = max_rows
+        self.filters = []
+        self.columns = None
+        self.order_by = None
+        self.bounds = None
+
+    def select(self, columns):
+        self.columns = columns.split(",")
+        return self
+
+    def in_(self, field, values):
+        self.filters.append((field, set(values)))
+        return self
+
+    def eq(self, field, value):
+        return self.in_(field, [value])
+
+    def order(self, field):
+        self.order_by = field
+        return self
+
+    def range(self, start, end):
+        query = FakeQuery(self.table, self.max_rows)
+        query.filters, query.columns, query.order_by = list(self.filters), self.columns, self.order_by
+        query.bounds = (start, end)
+        return query
+
+    def insert(self, rows):
+        self.inserted = rows
+        return self
+
+    def execute(self):
+        if getattr(self, "inserted", None) is not None:
+            for row in self.inserted:
+                self.table.append({**row, "id": len(self.table) + 1})
+            return FakeResponse(self.inserted)
+        rows = [row for row in self.table if all(row.get(f) in values for f, values in self.filters)]
+        if self.order_by:
+            rows.sort(key=lambda row: row[self.order_by])
+        if self.bounds:
+            rows = rows[self.bounds[0]:self.bounds[1] + 1]
+        rows = rows[:self.max_rows]
+        return FakeResponse([{c: row.get(c) for c in self.columns} for row in rows])
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeClient:
+    def __init__(self, rows, max_rows=1000):
+        self.rows = [{**row, "id": i} for i, row in enumerate(rows, 1)]
+        self.max_rows = max_rows
+
+    def table(self, name):
+        assert name == storage.TABLE
+        return FakeQuery(self.rows, self.max_rows)
+
+
+def _row(port_code, date, minute):
+    return {"port_code": port_code, "date": date, "time": f"{minute // 60:02d}:{minute % 60:02d}:00"}
+
+
+def _supabase(rows, max_rows):
+    backend = storage.SupabaseStorage("http://supabase.invalid", "key")
+    backend._client = FakeClient(rows, max_rows)
+    return backend
+
+
+@pytest.mark.parametrize("max_rows", [1000, 200])
+def test_supabase_existing_keys_survives_capped_responses(max_rows, monkeypatch):
+    monkeypatch.setattr(storage, "SUPABASE_PAGE_ROWS", min(storage.SUPABASE_PAGE_ROWS, max_rows))
+    # A day of minute readings for two ports: the port_code/date/time superset
+    # of any 500 keys is far more than one capped response.
+    stored = [_row(code, "2025-06-02", m) for code in ("250401", "250601") for m in range(24 * 60)]
+    backend = _supabase(stored, max_rows)
+
+    keys = [storage.row_key(row) for row in stored[-storage.BATCH_SIZE:]]
+    assert backend.existing_keys(keys) == set(keys)
+
+
+def test_supabase_insert_new_skips_every_stored_key():
+    stored = [_row("250401", "2025-06-02", m) for m in range(24 * 60)]
+    backend = _supabase(stored, max_rows=1000)
+
+    fresh = [_row("250401", "2025-06-03", m) for m in range(10)]
+    assert backend.insert_new(stored + fresh) == (len(fresh), len(stored))
+    assert len(backend.client.rows) == len(stored) + len(fresh)
+
+
+@pytest.mark.parametrize("backend_kind", ["memory", "sqlite"])
+def test_insert_new_matches_exact_keys(backend_kind, tmp_path):
+    backend = storage.MemoryStorage() if backend_kind == "memory" else storage.SQLiteStorage(str(tmp_path / "remote.db"))
+    first = [_row(code, "2025-06-02", m) for code in ("250401", "250601") for m in range(700)]
+    assert backend.insert_new(first) == (len(first), 0)
+
+    # Same ports and dates, other times: nothing but exact keys may match.
+    second = [_row(code, "2025-06-02", m) for code in ("250401", "250601") for m in range(650, 750)]
+    assert backend.insert_new(second) == (100, 100)
+    assert backend.existing_keys([("250401", "2025-06-02", "23:00:00")]) == set()
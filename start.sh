@@ -1,3 +1,10 @@
 #!/bin/bash
 echo "PORT is: $PORT"
-uvicorn border_app:app --host 0.0.0.0 --port $PORT
\ No newline at end of file
+# Several workers share their Prometheus metrics through files in one
+# directory, which must start out empty (see metrics.py).
+if [ "${WEB_CONCURRENCY:-1}" -gt 1 ]; then
+  export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/bwt_prometheus}"
+  mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+  rm -f "$PROMETHEUS_MULTIPROC_DIR"/*.db
+fi
+uvicorn border_app:app --host 0.0.0.0 --port $PORT